@@ -1,10 +1,65 @@
-from .asgi import *
-from .watchdog import *
-from .uwsgi import *
-from .template import Template
-from .template import *
-from .restful import *
-from .assets import *
+import importlib
+
+_LAZY = {
+    "Asset": ".assets",
+    "RestApi": ".restful",
+    "TemplateLoader": ".template",
+    "Filters": ".template",
+    "Template": ".template",
+    # Инструменты разработки, см. muscles.asgi.dev
+    "UwsgiReload": ".uwsgi",
+    "Watchdog": ".watchdog",
+    "PatternMatchingHandler": ".watchdog",
+    "ResponseErrorHandler": ".asgi.error_handler",
+    "AsgiStrategy": ".asgi.strategy",
+    "ImproperBodyPartContentException": ".asgi.request",
+    "NonMultipartContentTypeException": ".asgi.request",
+    "BodyPart": ".asgi.request",
+    "FileStorage": ".asgi.request",
+    "FieldStorage": ".asgi.request",
+    "Request": ".asgi.request",
+    "Response": ".asgi.response",
+    "BadResponse": ".asgi.response",
+    "BaseResponse": ".asgi.response",
+    "MakeResponse": ".asgi.response",
+    "JsonResponse": ".asgi.response",
+    "json_response": ".asgi.response",
+    "code_status": ".asgi.http_code",
+    "Transport": ".asgi.server",
+    "AsgiTransport": ".asgi.server",
+    "AsgiServer": ".asgi.server",
+    "RouteRule": ".asgi.routers",
+    "RouteRuleDefault": ".asgi.routers",
+    "RouteRuleVar": ".asgi.routers",
+    "RouteRuleInt": ".asgi.routers",
+    "RouteRuleFloat": ".asgi.routers",
+    "Itinerary": ".asgi.routers",
+    "Node": ".asgi.routers",
+    "Routes": ".asgi.routers",
+    "Api": ".asgi.routers",
+    "api": ".asgi.routers",
+    "routes": ".asgi.routers",
+    "itinerary": ".asgi.routers",
+    "warmup": ".asgi.routers",
+}
+
+
+def __getattr__(name):
+    """
+    Ленивый импорт публичных имен пакета (PEP 562)
+
+    :param name: Имя атрибута
+    :return:
+    """
+    if name not in _LAZY:
+        raise AttributeError("module %r has no attribute %r" % (__name__, name))
+    value = getattr(importlib.import_module(_LAZY[name], __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return list(_LAZY) + list(globals())
 
 
 __all__ = (
@@ -13,9 +68,6 @@ __all__ = (
     "TemplateLoader",
     "Filters",
     "Template",
-    "UwsgiReload",
-    "Watchdog",
-    "PatternMatchingHandler",
     "ResponseErrorHandler",
     "AsgiStrategy",
     "ImproperBodyPartContentException",
@@ -28,6 +80,8 @@ __all__ = (
     "BadResponse",
     "BaseResponse",
     "MakeResponse",
+    "JsonResponse",
+    "json_response",
     "code_status",
     "Transport",
     "AsgiTransport",
@@ -44,4 +98,5 @@ __all__ = (
     "api",
     "routes",
     "itinerary",
+    "warmup",
 )
@@ -1,12 +1,56 @@
-from .strategy import AsgiStrategy
-from .request import ImproperBodyPartContentException, NonMultipartContentTypeException, BodyPart, FileStorage, \
-    FieldStorage, Request
-from .response import MakeResponse, BaseResponse, Response, BadResponse
-from .error_handler import ResponseErrorHandler
-from .http_code import code_status
-from .server import Transport, AsgiTransport, AsgiServer
-from .routers import RouteRule, RouteRuleDefault, RouteRuleVar, RouteRuleInt, RouteRuleFloat, Itinerary, Node, Routes, \
-    Api, api, routes, itinerary
+import importlib
+
+_LAZY = {
+    "AsgiStrategy": ".strategy",
+    "ImproperBodyPartContentException": ".request",
+    "NonMultipartContentTypeException": ".request",
+    "BodyPart": ".request",
+    "FileStorage": ".request",
+    "FieldStorage": ".request",
+    "Request": ".request",
+    "MakeResponse": ".response",
+    "JsonResponse": ".response",
+    "json_response": ".response",
+    "BaseResponse": ".response",
+    "Response": ".response",
+    "BadResponse": ".response",
+    "ResponseErrorHandler": ".error_handler",
+    "code_status": ".http_code",
+    "Transport": ".server",
+    "AsgiTransport": ".server",
+    "AsgiServer": ".server",
+    "RouteRule": ".routers",
+    "RouteRuleDefault": ".routers",
+    "RouteRuleVar": ".routers",
+    "RouteRuleInt": ".routers",
+    "RouteRuleFloat": ".routers",
+    "Itinerary": ".routers",
+    "Node": ".routers",
+    "Routes": ".routers",
+    "Api": ".routers",
+    "api": ".routers",
+    "routes": ".routers",
+    "itinerary": ".routers",
+    "warmup": ".routers",
+}
+
+
+def __getattr__(name):
+    """
+    Ленивый импорт публичных имен пакета (PEP 562)
+
+    :param name: Имя атрибута
+    :return:
+    """
+    if name not in _LAZY:
+        raise AttributeError("module %r has no attribute %r" % (__name__, name))
+    value = getattr(importlib.import_module(_LAZY[name], __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return list(_LAZY) + list(globals())
 
 
 __all__ = (
@@ -22,6 +66,8 @@ __all__ = (
     "BadResponse",
     "BaseResponse",
     "MakeResponse",
+    "JsonResponse",
+    "json_response",
     "code_status",
     "Transport",
     "AsgiServer",
@@ -38,4 +84,5 @@ __all__ = (
     "api",
     "routes",
     "itinerary",
-)
\ No newline at end of file
+    "warmup",
+)
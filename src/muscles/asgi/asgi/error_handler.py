@@ -1,3 +1,4 @@
+import traceback
 
 
 class MuscularError(Exception):
@@ -66,3 +67,26 @@ class AttributeException(ApplicationException):
         self.body = body or "Attribute error."
         super().__init__(self.status, self.reason)
 
+
+class LazyTraceback:
+    """
+    Трассировка исключения, которая форматируется только при первом обращении
+    """
+    __slots__ = ('tb', '_lines')
+
+    def __init__(self, tb):
+        self.tb = tb
+        self._lines = None
+
+    def format(self) -> list:
+        """
+        Строки трассировки, как у traceback.format_tb
+
+        :return: list
+        """
+        if self._lines is None:
+            self._lines = traceback.format_tb(self.tb)
+        return self._lines
+
+    def __str__(self):
+        return ''.join(self.format())
@@ -394,4 +394,8 @@ code_status = {
         "spec_title": "RFC6585#6",
         "spec_href": "https://tools.ietf.org/html/rfc6585#section-6"
     }
-}
\ No newline at end of file
+}
+
+
+#: Готовые строки статуса ответа: status_line[404] == "404 Not Found"
+status_line = {int(code): "%s %s" % (code, item["message"]) for code, item in code_status.items()}
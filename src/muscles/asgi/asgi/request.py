@@ -1,30 +1,136 @@
 import asyncio
-import cgi
+import io
 import traceback
 import urllib
-from urllib.parse import urlparse, urlunparse, parse_qs
+from urllib.parse import urlparse, urlunparse
 from operator import itemgetter
-from multipart import MultipartParser
+from collections import defaultdict
+from functools import lru_cache, cached_property
 import re
 
 from muscles.core import Dependency
 from muscles.core import EventsStorageInterface
 from muscles.core import inject
 import json
-import sys
-import email.parser
 import tempfile
 import os
 import magic
 from http.cookies import SimpleCookie
 from .error_handler import ApplicationException, AttributeException
 
+#: Размер блока при потоковом чтении и отдаче файлов
+DEFAULT_CHUNK_SIZE = 32 * 1024
+
+_MULTISLASH = re.compile(r'/+')
+_HEADER_FOLD = re.compile(r'\r?\n[ \t]+')
+_DISPOSITION_PARAM = re.compile(r'(\w+)=(?:"([^"]*)"|([^;]*))')
+_BOUNDARY = re.compile(r';\s*boundary=("[^"]*"|[^;]*)', re.IGNORECASE)
+_magic = None
+
+
+def _mime_from_buffer(buffer):
+    """
+    Определяет MIME тип содержимого через libmagic.
+    Объект Magic загружает базу сигнатур, поэтому создается один раз на процесс
+
+    :param buffer: Содержимое
+    :return: string
+    """
+    global _magic
+    if not buffer:
+        return 'application/x-empty'
+    if _magic is None:
+        _magic = magic.Magic(mime=True)
+    return _magic.from_buffer(buffer)
+
 
 def _split_on_find(content, bound):
     point = content.find(bound)
     return content[:point], content[point + len(bound):]
 
 
+@lru_cache(maxsize=256)
+def _header_title(name):
+    """
+    Имя заголовка запроса в виде Title-Case: content-type => Content-Type, HTTP_USER_AGENT => User-Agent.
+    Набор имен заголовков невелик, поэтому результат кэшируется
+
+    :param name: Имя заголовка из scope
+    :return: str
+    """
+    if name.startswith(('HTTP_', 'http_')):
+        return name[5:].title().replace('_', '-')
+    return name.title()
+
+
+def _parse_content_type(value):
+    """
+    Разбирает заголовок Content-Type: text/html; charset=UTF-8 => ('text/html', {'charset': 'UTF-8'})
+    Параметр boundary уникален для каждого запроса multipart, поэтому он отделяется до кэшированного
+    разбора и не вытесняет из кэша остальные значения. Результат не должен изменяться
+
+    :param value: Значение заголовка
+    :return: (тип в нижнем регистре, параметры)
+    """
+    match = _BOUNDARY.search(value)
+    if match is None:
+        return _parse_media_type(value)
+    main, params = _parse_media_type(value[:match.start()] + value[match.end():])
+    params = dict(params)
+    params['boundary'] = match.group(1).strip().strip('"')
+    return main, params
+
+
+@lru_cache(maxsize=64)
+def _parse_media_type(value):
+    """
+    Разбирает Content-Type без параметра boundary, результат кэшируется
+
+    :param value: Значение заголовка
+    :return: (тип в нижнем регистре, параметры)
+    """
+    main, _, rest = value.partition(';')
+    params = {}
+    for param in rest.split(';'):
+        key, sep, val = param.partition('=')
+        if sep:
+            params[key.strip().lower()] = val.strip().strip('"')
+    return main.strip().lower(), params
+
+
+@lru_cache(maxsize=1024)
+def _parse_q_list(value):
+    """
+    Разбирает заголовок со списком значений и весами q, сортируя по убыванию веса:
+    text/html, application/xml;q=0.9, */*;q=0.8 => ('text/html', 'application/xml', '*/*')
+
+    :param value: Значение заголовка
+    :return: tuple или None, если вес не число
+    """
+    items = []
+    for item in value.lower().split(','):
+        head, _, q = item.partition(';q=')
+        try:
+            items.append((head.strip(), float(q) if q else 1.0))
+        except ValueError:
+            return None
+    items.sort(key=itemgetter(1), reverse=True)
+    return tuple(head for head, q in items)
+
+
+@lru_cache(maxsize=1024)
+def _parse_cookie(value):
+    """
+    Разбирает заголовок Cookie
+
+    :param value: Значение заголовка
+    :return: tuple((имя, значение), ...)
+    """
+    cookie = SimpleCookie()
+    cookie.load(value)
+    return tuple((k, v.value) for k, v in cookie.items())
+
+
 class ImproperBodyPartContentException(Exception):
     pass
 
@@ -34,13 +140,64 @@ class NonMultipartContentTypeException(Exception):
 
 
 def _header_parser(string, encoding):
-    major = sys.version_info[0]
-    if major == 3:
-        string = string.decode(encoding)
-    headers = email.parser.HeaderParser().parsestr(string).items()
-    return (
-        (k, v) for k, v in headers
-    )
+    """
+    Разбирает заголовки части multipart, строки-продолжения склеиваются с предыдущей
+
+    :param string: Заголовки
+    :param encoding: Кодировка
+    :return: list((имя, значение), ...)
+    """
+    headers = []
+    for line in _HEADER_FOLD.sub(' ', string.decode(encoding)).splitlines():
+        name, sep, value = line.partition(':')
+        if sep:
+            headers.append((name.strip(), value.strip()))
+    return headers
+
+
+def _iter_multipart(body, boundary, encoding):
+    """
+    Делит тело multipart/form-data на части поиском разделителя (bytes.find)
+
+    :param body: Тело запроса
+    :param boundary: Разделитель частей из Content-Type
+    :param encoding: Кодировка заголовков частей
+    :return: generator(BodyPart)
+    """
+    delimiter = b'--' + boundary
+    separator = b'\r\n' + delimiter
+    start = body.find(delimiter)
+    if start == -1:
+        raise ImproperBodyPartContentException('boundary not found')
+    start += len(delimiter)
+    while not body.startswith(b'--', start):
+        end = -1
+        head = body.find(b'\r\n\r\n', start)
+        if head != -1:
+            # Часть с Content-Length берем срезом, если за ней сразу идет разделитель
+            length = _content_length(body[start:head])
+            if length is not None and body.startswith(separator, head + 4 + length):
+                end = head + 4 + length
+        if end == -1:
+            end = body.find(separator, start)
+        if end == -1:
+            raise ImproperBodyPartContentException('closing boundary not found')
+        yield BodyPart(body[start:end], encoding)
+        start = end + len(separator)
+
+
+def _content_length(header):
+    """
+    Content-Length из заголовков части multipart
+
+    :param header: Заголовки части
+    :return: int или None, если заголовка нет или значение некорректно
+    """
+    point = header.lower().find(b'\ncontent-length:')
+    if point == -1:
+        return None
+    value = header[point + 16:].split(b'\r\n', 1)[0].strip()
+    return int(value) if value.isdigit() else None
 
 
 class BodyPart(object):
@@ -49,6 +206,8 @@ class BodyPart(object):
 
     """
 
+    __slots__ = ('encoding', 'content', 'headers', '_name', '_filename')
+
     def __init__(self, content, encoding):
         self.encoding = encoding
         headers = {}
@@ -56,7 +215,7 @@ class BodyPart(object):
         if b'\r\n\r\n' in content:
             first, self.content = _split_on_find(content, b'\r\n\r\n')
             if first != b'':
-                headers = _header_parser(first.lstrip(), encoding)
+                headers = tuple(_header_parser(first.lstrip(), encoding))
         else:
             raise ImproperBodyPartContentException(
                 'content does not contain CR-LF-CR-LF'
@@ -65,15 +224,12 @@ class BodyPart(object):
         self._name = None
         self._filename = None
         for k, v in self.headers:
-            if k == 'Content-Disposition':
-                v = v.split("; ")
-                for vi in v:
-                    u = vi.split("=")
-                    if len(u) > 1:
-                        if u[0] == 'name':
-                            self._name = u[1].strip('"')
-                        if u[0] == 'filename':
-                            self._filename = u[1].strip('"')
+            if k.lower() == 'content-disposition':
+                for key, quoted, plain in _DISPOSITION_PARAM.findall(v):
+                    if key == 'name':
+                        self._name = quoted or plain.strip()
+                    elif key == 'filename':
+                        self._filename = quoted or plain.strip()
 
     @property
     def text(self):
@@ -83,6 +239,17 @@ class BodyPart(object):
         """
         return self.content.decode(self.encoding)
 
+    @property
+    def content_type(self):
+        """
+        Content-Type части запроса
+        :return: unicode
+        """
+        for k, v in self.headers:
+            if k.lower() == 'content-type':
+                return v
+        return None
+
     @property
     def name(self):
         """
@@ -111,32 +278,41 @@ class FileStorage:
     Хранилище файлов
     """
 
+    __slots__ = ('_name', '_value', '_fp', '_filepath', '_filename', '_file_type', '_mime_type', '_bytes_read')
+
     def __init__(self, name, value, filename=None, mime_type=None, file_type=None, bytes_read=0):
         self._name = name
         self._value = value
-        # TODO Если оставить сохранение в файл то открывается уязвимость переполнения файловой системы,
-        #  лучше переделать на поток
-        self.fp = tempfile.NamedTemporaryFile(prefix="tempfile_", suffix="_muscular")
-        self.fp.write(self._value)
-        self.fp.seek(0)
-        self._filepath = self.fp.name
+        # Содержимое уже в памяти, файл на диске создается только при обращении к filepath
+        self._fp = None
+        self._filepath = None
         self._filename = filename
         self._file_type = file_type
         if mime_type is None:
-            mime = magic.Magic(mime=True)
-            mime_type = mime.from_buffer(self._value)
+            mime_type = _mime_from_buffer(self._value)
         self._mime_type = mime_type
         self._bytes_read = bytes_read
 
     def __del__(self):
         try:
-            self.fp.close()
+            if self._fp is not None:
+                self._fp.close()
         except AttributeError:
             pass
 
     def load(self):
         return self.fp.read()
 
+    @property
+    def fp(self):
+        """
+        Файловый объект с содержимым
+        :return: file
+        """
+        if self._fp is None:
+            self._fp = io.BytesIO(self._value)
+        return self._fp
+
     @property
     def name(self):
         """
@@ -148,9 +324,17 @@ class FileStorage:
     @property
     def filepath(self):
         """
-        Путь к файлу
+        Путь к файлу, при первом обращении содержимое записывается во временный файл
         :return: string
         """
+        if self._filepath is None:
+            fp = tempfile.NamedTemporaryFile(prefix="tempfile_", suffix="_muscular")
+            fp.write(self._value)
+            fp.seek(0)
+            if self._fp is not None:
+                self._fp.close()
+            self._fp = fp
+            self._filepath = fp.name
         return self._filepath
 
     @property
@@ -192,7 +376,8 @@ class FileStorage:
         return self
 
     def __exit__(self, *args):
-        self.fp.close()
+        if self._fp is not None:
+            self._fp.close()
 
     def save(self, filepath=None):
         """
@@ -202,10 +387,11 @@ class FileStorage:
         """
         self._filepath = os.path.abspath(filepath)
         self._filename = os.path.basename(self._filepath)
-        fp = open(filepath, 'wb')
-        fp.write(self.fp.read())
-        self.fp.close()
-        self.fp = fp
+        with open(filepath, 'wb') as fp:
+            fp.write(self._value)
+        if self._fp is not None:
+            self._fp.close()
+        self._fp = None
 
 
 class FieldStorage:
@@ -213,6 +399,8 @@ class FieldStorage:
     Хранилище полей формы
     """
 
+    __slots__ = ('_name', '_value')
+
     def __init__(self, name, value):
         self._name = name
         self._value = value
@@ -249,6 +437,11 @@ class Request:
     Тело запроса к сервверу
     """
 
+    # __dict__ оставлен для атрибутов, которые навешивают обработчики init_request/before_request,
+    # и для cached_property: части URL, query, cookies и accept разбираются при первом обращении
+    __slots__ = ('parts', 'type', '_is_json', '_is_xml', '_is_form', '_is_buffer', '_method', 'protocol', 'url',
+                 'server', 'headers', 'remote_addr', '_exception', '_body', 'route', 'actor', 'itinerary', '__dict__')
+
     __charset = 'utf8'
     _before_start = []
 
@@ -310,26 +503,87 @@ class Request:
             self._body = body
             self._exception = None
 
-        o = urlparse(self.url)
-        self.scheme = o.scheme
-        self.netloc = o.netloc
-        self.path = o.path
-        self._query = o.query
-        self.fragment = o.fragment
-        self.username = o.username
-        self.password = o.password
-        self.hostname = o.hostname
-        self.port = o.port
-
         self.route = None
         self.actor = None
+        self.itinerary = None
 
         """ Запускает обработку событий инициализации запроса Request """
         events = Dependency.resolve(EventsStorageInterface)
-        if events is not None and events.get('init_request') is not None:
-            for func in events.get('init_request'):
+        hooks = events.get('init_request') if events is not None else None
+        if hooks:
+            for func in hooks:
                 func(request=self)
 
+    @cached_property
+    def _url(self):
+        """
+        Разобранный URL запроса
+        """
+        return urlparse(self.url)
+
+    @cached_property
+    def scheme(self) -> str:
+        """
+        Схема URL
+        """
+        return self._url.scheme
+
+    @cached_property
+    def netloc(self) -> str:
+        """
+        Сетевая часть URL
+        """
+        return self._url.netloc
+
+    @cached_property
+    def path(self) -> str:
+        """
+        Путь запроса
+        """
+        return self._url.path
+
+    @cached_property
+    def _query(self) -> str:
+        """
+        Строка query
+        """
+        return self._url.query
+
+    @cached_property
+    def fragment(self) -> str:
+        """
+        Фрагмент URL
+        """
+        return self._url.fragment
+
+    @cached_property
+    def username(self) -> [str, None]:
+        """
+        Имя пользователя из URL
+        """
+        return self._url.username
+
+    @cached_property
+    def password(self) -> [str, None]:
+        """
+        Пароль из URL
+        """
+        return self._url.password
+
+    @cached_property
+    def hostname(self) -> [str, None]:
+        """
+        Хост из URL
+        """
+        return self._url.hostname
+
+    @cached_property
+    def port(self) -> [int, None]:
+        """
+        Порт из URL
+        """
+        return self._url.port
+
     @staticmethod
     @inject(EventsStorageInterface)
     def init_request(evnetStorage: EventsStorageInterface):
@@ -425,35 +679,36 @@ class Request:
         """
         POST?
         """
-        return self._method.upper() == 'post'.upper()
+        return self._method == 'POST'
 
     @property
     def is_get(self) -> bool:
         """
         GET?
         """
-        return self._method.upper() == 'get'.upper()
+        return self._method == 'GET'
 
     @property
     def is_put(self) -> bool:
         """
         PUT?
         """
-        return self._method.upper() == 'put'.upper()
+        return self._method == 'PUT'
 
     @property
     def is_delete(self) -> bool:
         """
         DELETE?
         """
-        return self._method.upper() == 'delete'.upper()
+        return self._method == 'DELETE'
 
     @property
     def is_secure(self) -> bool:
         """
         ``True`` Если (HTTPS or WSS).
         """
-        return self.scheme in {"https", "wss"}
+        scheme = self.scheme
+        return scheme == "https" or scheme == "wss"
 
     @property
     def base_url(self) -> str:
@@ -480,36 +735,29 @@ class Request:
             scheme=self.scheme, hostname=self.hostname, port=self.port
         )
 
-    @property
+    @cached_property
     def query(self) -> dict:
         """
         Получаем часть запроса query в формате ключ/значение
         """
-        q = parse_qs(self._query)
-        p = {}
-        for item_key in q:
-            p.update({item_key: q[item_key] if len(q[item_key]) > 1 else q[item_key][0]})
-        return p
+        params = {}
+        for key, value in urllib.parse.parse_qsl(self._query):
+            exists = params.get(key)
+            if exists is None:
+                params[key] = value
+            elif isinstance(exists, list):
+                exists.append(value)
+            else:
+                params[key] = [exists, value]
+        return params
 
-    @property
+    @cached_property
     def m_query(self) -> dict:
         """
-        Получаем часть запроса query в формате ключ/[значения] или ключ/значение
+        Получаем часть запроса query в формате ключ/[значения] или ключ/значение.
+        Разбор общий с query, но словарь и списки значений свои, изменения не затрагивают query
         """
-        vals = urllib.parse.parse_qsl(self._query)
-        params = {}
-        if vals and isinstance(vals, list):
-            for val in vals:
-                if val[0] in params and not isinstance(params[val[0]], list):
-                    d = [params[val[0]], val[1]]
-                    del params[val[0]]
-                    params[val[0]] = val[1]
-                    params.update({val[0]: d})
-                elif val[0] in params and isinstance(params[val[0]], list):
-                    params[val[0]].append(val[1])
-                else:
-                    params.update({val[0]: val[1]})
-        return params
+        return {key: list(value) if isinstance(value, list) else value for key, value in self.query.items()}
 
     @property
     def raw_query(self) -> list:
@@ -518,18 +766,14 @@ class Request:
         """
         return urllib.parse.parse_qsl(self._query)
 
-    @property
+    @cached_property
     def cookies(self) -> "ImmutableMultiDict[str, str]":
         """
         Печеньки запроса
         :return:
         """
-        if self.headers.get("Cookie"):
-            cookie = SimpleCookie()
-            cookie.load(self.headers.get("Cookie"))
-            return {k: v.value for k, v in cookie.items()}
-        else:
-            return {}
+        value = self.headers.get("Cookie")
+        return dict(_parse_cookie(value)) if value else {}
 
     @property
     def content_length(self) -> [int, None]:
@@ -548,68 +792,38 @@ class Request:
 
         return None
 
-    @property
+    @cached_property
     def accept_language(self) -> []:
         """
         Язык запроса
         """
-        accept_language = self.headers.get("Accept-Language")
-
-        def normalized(language):
-            l = language.lower().split(';q=')
-            return l[0], float(l[1]) if len(l) > 1 else float(1)
-
-        if accept_language is not None:
-            accept_language = accept_language.lower().split(',')
-            try:
-                languages = [normalized(language) for language in accept_language]
-                languages = sorted(languages, key=itemgetter(1), reverse=True)
-                return [language[0] for language in languages]
-            except (ValueError, TypeError) as e:
-                pass
-        return None
+        value = self.headers.get("Accept-Language")
+        if value is None:
+            return None
+        items = _parse_q_list(value)
+        return list(items) if items is not None else None
 
-    @property
+    @cached_property
     def accept_encoding(self) -> [str, None]:
         """
         Кодировка запроса
         """
-        accept_encoding = self.headers.get("Accept-Encoding")
-
-        def normalized(encoding):
-            l = encoding.lower().split(';q=')
-            return l[0], float(l[1]) if len(l) > 1 else float(1)
-
-        if accept_encoding is not None:
-            accept_encoding = accept_encoding.lower().split(',')
-            try:
-                encodings = [normalized(encoding) for encoding in accept_encoding]
-                encodings = sorted(encodings, key=itemgetter(1), reverse=True)
-                return [encoding[0] for encoding in encodings]
-            except (ValueError, TypeError) as e:
-                pass
-        return None
+        value = self.headers.get("Accept-Encoding")
+        if value is None:
+            return None
+        items = _parse_q_list(value)
+        return list(items) if items is not None else None
 
-    @property
+    @cached_property
     def accept(self) -> [str, None]:
         """
         Accept: text/html, application/xhtml+xml, application/xml;q=0.9, */*;q=0.8
         """
-        accept = self.headers.get("Accept")
-
-        def normalized(accept):
-            l = accept.lower().split(';q=')
-            return l[0], float(l[1]) if len(l) > 1 else float(1)
-
-        if accept is not None:
-            accept = accept.lower().split(',')
-            try:
-                accepts = [normalized(acp) for acp in accept]
-                accepts = sorted(accepts, key=itemgetter(1), reverse=True)
-                return [accept[0] for accept in accepts]
-            except (ValueError, TypeError) as e:
-                pass
-        return None
+        value = self.headers.get("Accept")
+        if value is None:
+            return None
+        items = _parse_q_list(value)
+        return list(items) if items is not None else None
 
     @property
     def content_type(self) -> [str, None]:
@@ -617,15 +831,7 @@ class Request:
         Content-Type: text/html; charset=UTF-8 => text/html
         Content-Type: multipart/form-data; boundary=something => multipart/form-data
         """
-        content_type = self.headers.get("Content-Type", 'text/html; charset=UTF-8')
-        if content_type is not None:
-            try:
-                content_type = content_type.lower().split("; ")
-                return content_type[0]
-            except (ValueError, TypeError):
-                pass
-
-        return None
+        return _parse_content_type(self.headers.get("Content-Type") or 'text/html; charset=UTF-8')[0]
 
     @property
     def boundary(self) -> [str, None]:
@@ -634,17 +840,10 @@ class Request:
         Content-Type: text/html; charset=UTF-8 => text/html
         Content-Type: multipart/form-data; boundary=something => multipart/form-data
         """
-        boundary = self.headers.get("Content-Type")
-        if boundary is not None:
-            try:
-                boundary = boundary.split("; ")
-                if len(boundary) > 1:
-                    boundary = boundary[1].split("=")
-                    return boundary[1] if len(boundary) > 1 and boundary[0].lower() == 'boundary' else None
-                return None
-            except (ValueError, TypeError):
-                pass
-        return None
+        content_type = self.headers.get("Content-Type")
+        if content_type is None:
+            return None
+        return _parse_content_type(content_type)[1].get('boundary')
 
     @property
     def user_agent(self) -> [str, None]:
@@ -667,16 +866,10 @@ class Request:
         Content-Type: multipart/form-data; boundary=something => None
         """
         content_type = self.headers.get("Content-Type")
-        if content_type is not None:
-            try:
-                content_type = content_type.lower().split("; ")
-                if len(content_type) > 1:
-                    charset = content_type[1].split("=")
-                    return charset[1].lower() if len(charset) > 1 and charset[0] == 'charset' else None
-            except (ValueError, TypeError):
-                pass
-
-        return None
+        if content_type is None:
+            return None
+        charset = _parse_content_type(content_type)[1].get('charset')
+        return charset.lower() if charset else None
 
     @property
     def charset(self) -> [str, None]:
@@ -684,7 +877,7 @@ class Request:
         Кодировка
         :return:
         """
-        return self.content_charset if self.content_charset else self.__charset
+        return self.content_charset or self.__charset
 
     @property
     def json(self):
@@ -790,6 +983,8 @@ class Request:
 
 
 class RequestMaker:
+    __slots__ = ('scope', 'receive', 'headers', 'body', '_request_type')
+
     text_mime_types = [
         'text/html',
         'text/plain',
@@ -801,25 +996,52 @@ class RequestMaker:
         'text/javascript'
     ]
 
+    _request_types = {
+        'multipart/form-data': 'multipart',
+        'application/x-www-form-urlencoded': 'form',
+        'text/plain': 'text',
+        'text/html': 'html',
+        'application/javascript': 'javascript',
+        'application/json': 'json',
+        'application/xml': 'xml',
+    }
+
+    #: Заголовки, которые есть в каждом запросе, и их значения по умолчанию
+    _default_headers = (
+        ('Host', None),
+        ('Connection', None),
+        ('Pragma', None),
+        ('Cache-Control', None),
+        ('Accept', None),
+        ('Accept-Language', None),
+        ('Accept-Encoding', None),
+        ('Origin', None),
+        ('User-Agent', None),
+        ('Content-Length', '0'),
+        ('Content-Type', 'text/html; charset=UTF-8'),
+    )
+
     def __init__(self, scope, receive):
         self.scope = scope
         self.receive = receive
 
-        self.path = re.sub(r'/+', '/', scope['path'].strip('/')) if 'path' in scope else None
-        self.query_string = scope['query_string'].decode('utf-8') if 'query_string' in scope else None
-        self.headers = dict((key.decode('utf-8'), value.decode('utf-8')) for key, value in self.scope['headers']) if 'headers' in scope else {}
-        self._request_types = {
-            'multipart/form-data': 'multipart',
-            'application/x-www-form-urlencoded': 'form',
-            'text/plain': 'text',
-            'text/html': 'html',
-            'application/javascript': 'javascript',
-            'application/json': 'json',
-            'application/xml': 'xml',
-        }
-
+        self.headers = {key.decode('utf-8'): value.decode('utf-8') for key, value in scope['headers']} if 'headers' in scope else {}
         # Получаем тело запроса (асинхронно)
         self.body = None
+        # False - тип запроса еще не определен
+        self._request_type = False
+
+    @property
+    def path(self):
+        """ Путь запроса без крайних и повторных слэшей, вычисляется только по запросу """
+        path = self.scope.get('path')
+        return _MULTISLASH.sub('/', path.strip('/')) if path is not None else None
+
+    @property
+    def query_string(self):
+        """ Строка запроса, декодируется только по запросу """
+        query_string = self.scope.get('query_string')
+        return query_string.decode('utf-8') if query_string is not None else None
 
     async def fetch_body(self):
         """ Асинхронное получение тела запроса """
@@ -832,59 +1054,42 @@ class RequestMaker:
         """
         Чтение тела запроса через функцию receive (асинхронно)
         """
-        body = b''
+        chunks = []
         more_body = True
 
         while more_body:
             message = await self.receive()
-            if message['type'] == 'lifespan.startup':
-                body += message.get('body', b'')
+            message_type = message['type']
+            if message_type == 'http.request' or message_type == 'lifespan.startup':
+                chunks.append(message.get('body', b''))
                 more_body = message.get('more_body', False)
-            elif message['type'] == 'http.request':
-                body += message.get('body', b'')
-                more_body = message.get('more_body', False)
-        return body
+            elif message_type == 'http.disconnect':
+                break
+        # Тело из одного сообщения отдаем без копирования
+        return chunks[0] if len(chunks) == 1 else b''.join(chunks)
 
     @property
     def request_type(self):
-        """ Определение типа запроса на основе заголовков """
-        headers = self.headers
-        if 'content-type' not in headers and 'accept' not in headers:
-            return None
-        for content_type in self._request_types:
-            if 'content-type' in headers and content_type in headers['content-type']:
-                return self._request_types[content_type]
-            elif 'accept' in headers and content_type in headers['accept'].split(","):
-                return self._request_types[content_type]
-        return None
+        """ Определение типа запроса на основе заголовков, вычисляется один раз """
+        if self._request_type is not False:
+            return self._request_type
+        request_type = None
+        header = self.headers.get('content-type')
+        accept = self.headers.get('accept')
+        if header is not None or accept is not None:
+            accepts = set(accept.split(",")) if accept is not None else ()
+            for content_type, value in self._request_types.items():
+                if (header is not None and content_type in header) or content_type in accepts:
+                    request_type = value
+                    break
+        self._request_type = request_type
+        return request_type
 
     @property
     def charset(self):
         """ Получение charset из заголовков """
-        charset = 'utf-8'
-        try:
-            content_type = self.headers.get('content-type', 'text/html; charset=UTF-8')
-            content_type = content_type.lower().split("; ")
-            if len(content_type) > 1:
-                _charset = content_type[1].split("=")
-                charset = _charset[1].lower() if len(_charset) > 1 and _charset[0] == 'charset' else 'utf-8'
-        except ValueError:
-            pass
-        return charset
-
-    def make_body_from_form(self):
-        """ Парсинг данных из формы (application/x-www-form-urlencoded) """
-        fields = {}
-        data = urllib.parse.parse_qsl(self.body.decode(self.charset))
-        for _data in data:
-            if fields.get(_data[0]) and isinstance(fields[_data[0]], list):
-                fields[_data[0]].append(_data[1])
-            elif fields.get(_data[0]):
-                fields[_data[0]] = [fields[_data[0]]]
-                fields[_data[0]].append(_data[1])
-            else:
-                fields[_data[0]] = _data[1]
-        return fields
+        charset = _parse_content_type(self.headers.get('content-type') or 'text/html')[1].get('charset')
+        return charset.lower() if charset else 'utf-8'
 
     async def make_body_from_buffer(self):
         if self.body is None:
@@ -893,8 +1098,10 @@ class RequestMaker:
 
     async def make_body_from_raw(self):
         input = await self.make_body_from_buffer()
-        mime = magic.Magic(mime=True)
-        mime_type = mime.from_buffer(input)
+        # Пустое тело и текст, заявленный в Content-Type, не проверяем через libmagic
+        if not input or _parse_content_type(self.headers.get('content-type', ''))[0] in self.text_mime_types:
+            return input
+        mime_type = _mime_from_buffer(input)
         if mime_type not in self.text_mime_types:
             input = FileStorage(None, input,
                                 filename=None,
@@ -918,59 +1125,47 @@ class RequestMaker:
 
     async def make_body_from_form(self):
         input = await self.make_body_from_buffer()
-        fields = {}
-        data = urllib.parse.parse_qsl(input.decode(self.charset))
-        for _data in data:
-            if fields.get(_data[0]) and isinstance(fields[_data[0]], list):
-                fields[_data[0]].append(FieldStorage(_data[0], _data[1]))
-            elif fields.get(_data[0]):
-                fields[_data[0]] = [fields[_data[0]]]
-                fields[_data[0]].append(FieldStorage(_data[0], _data[1]))
-            else:
-                fields[_data[0]] = FieldStorage(_data[0], _data[1])
-        return fields
+        fields = defaultdict(list)
+        for key, value in urllib.parse.parse_qsl(input.decode(self.charset)):
+            fields[key].append(FieldStorage(key, value))
+        return {key: values[0] if len(values) == 1 else values for key, values in fields.items()}
 
-    async def make_body_from_multipart(self, content_type, body):
+    async def make_body_from_multipart(self):
         """
-        Разбираем данные multipart/form-data с использованием библиотеки python-multipart
+        Разбираем данные multipart/form-data
         """
-        try:
-            input = await self.make_body_from_buffer()
-            fields = {}
-
-            # Получаем заголовок Content-Type и boundary
-            content_type = self.headers.get('content-type', '')
-            boundary = content_type.split("boundary=")[-1].encode()
-
-            if not boundary:
-                raise ValueError("Boundary не найден в заголовке Content-Type")
+        input = await self.make_body_from_buffer()
+        fields = {}
 
-            # Создаем MultipartParser для разбора данных
-            parser = MultipartParser(input, boundary)
+        # Получаем boundary из заголовка Content-Type
+        boundary = _parse_content_type(self.headers.get('content-type', ''))[1].get('boundary', '').encode('latin-1')
+        if not boundary:
+            raise ApplicationException(status=400, reason='Bad request', body='Boundary не найден в заголовке Content-Type')
 
-            # Парсим данные
-            for part in parser:
-                disposition = part.headers.get(b'Content-Disposition', b'').decode('utf-8')
-                if 'filename=' in disposition:
+        try:
+            for part in _iter_multipart(input, boundary, self.charset):
+                if part.filename is not None:
                     # Если это файл
-                    name = disposition.split('name=')[1].split(';')[0].strip('"')
-                    filename = disposition.split('filename=')[1].strip('"')
-                    fields[name] = {
-                        'filename': filename,
-                        'content_type': part.headers.get(b'Content-Type', b'text/plain').decode('utf-8'),
-                        'content': part.file.read(),
-                        'size': len(part.file.read())
+                    fields[part.name] = {
+                        'filename': part.filename,
+                        'content_type': part.content_type or 'text/plain',
+                        'content': part.content,
+                        'size': len(part.content)
                     }
                 else:
                     # Если это обычное поле формы
-                    name = disposition.split('name=')[1].strip('"')
-                    fields[name] = part.file.read().decode('utf-8')
+                    fields[part.name] = part.text
+        except ImproperBodyPartContentException as e:
+            raise ApplicationException(status=400, reason='Bad request', body=str(e))
+        return fields
 
-            return fields
-        except Exception as e:
-            print(e)
-            traceback.extract_tb(e.__traceback__)
-            raise
+    #: Метод разбора тела по типу запроса, остальные типы читаются как есть через make_body_from_raw.
+    #: Хранятся имена, чтобы переопределенные в наследниках методы тоже вызывались
+    _body_makers = {
+        'json': 'make_body_from_json',
+        'form': 'make_body_from_form',
+        'multipart': 'make_body_from_multipart',
+    }
 
     def make_headers(self) -> dict:
         """
@@ -978,26 +1173,11 @@ class RequestMaker:
 
         :return: dict
         """
-        headers = {}
-        if len(self.headers) > 0:
-            headers.update({'Host': self.headers.get('Host', None)})
-            headers.update({'Connection': self.headers.get('Connection', None)})
-            headers.update({'Pragma': self.headers.get('Pragma', None)})
-            headers.update({'Cache-Control': self.headers.get('Cache-Control', None)})
-            headers.update({'Accept': self.headers.get('Accept', None)})
-            headers.update({'Accept-Language': self.headers.get('Accept-Language', None)})
-            headers.update({'Accept-Encoding': self.headers.get('Accept-Encoding', None)})
-            headers.update({'Origin': self.headers.get('Origin', None)})
-            headers.update({'User-Agent': self.headers.get('User-Agent', None)})
-            headers.update({'Content-Length': self.headers.get('Content-Length', '0')})
-            headers.update({'Content-Type': self.headers.get('Content-Type', 'text/html; charset=UTF-8')})
-            for key in self.headers:
-                if 'HTTP_' == key[0:5] or 'http_' == key[0:5]:
-                    headers.update({key[5:].title().replace('_', '-'): self.headers[key]})
-                elif 'X-' == key[0:2] or 'x-' == key[0:2]:
-                    headers.update({key.title(): self.headers[key]})
-                else:
-                    headers.update({key.title(): self.headers[key]})
+        if not self.headers:
+            return {}
+        headers = dict(self._default_headers)
+        for key, value in self.headers.items():
+            headers[_header_title(key)] = value
         return headers
 
     async def make(self) -> Request:
@@ -1007,33 +1187,40 @@ class RequestMaker:
         :return: Request
         """
         scope = self.scope
-        if self.request_type and hasattr(self, "make_body_from_%s" % self.request_type):
+        maker = self._body_makers.get(self.request_type)
+        if maker is not None:
             try:
-                method = getattr(self, "make_body_from_%s" % self.request_type)
-                wsgi_input = await method()
+                wsgi_input = await getattr(self, maker)()
             except ApplicationException as ex:
                 wsgi_input = ex
         else:
             wsgi_input = await self.make_body_from_raw()
+        get = scope.get
+        scheme = get('scheme')
+        raw_path = get('raw_path')
+        query_string = get('query_string')
+        server = get('server')
+        client = get('client')
         host = self.headers.get('host', None)
+        url = raw_path.decode('utf-8') if raw_path is not None else ''
+        if host is not None:
+            url = "%s://%s%s" % (scheme, host, url)
+        if query_string:
+            url = "%s?%s" % (url, query_string.decode('utf-8'))
+        request_type = self.request_type
         request = Request(
-            type=scope['type'] if 'type' in scope else None,
-            method=scope['method'] if 'method' in scope else None,
-            protocol=scope['scheme'] if 'scheme' in scope else None,
-            url="%s%s%s%s" % (
-                "%s://" % scope['scheme'] if host is not None else '',
-                host if host is not None else '',
-                scope['raw_path'].decode('utf-8') if 'raw_path' in scope else '',
-                "?%s" % scope['query_string'].decode('utf-8') if 'query_string' in scope and len(scope['query_string']) > 0 else ''
-            ),
-            server=(scope['server'][0], scope['server'][1]) if 'server' in scope else None,
-            remote_addr=(scope['client'][0], scope['client'][1]) if 'client' in scope else None,
+            type=get('type'),
+            method=get('method'),
+            protocol=scheme,
+            url=url,
+            server=(server[0], server[1]) if server is not None else None,
+            remote_addr=(client[0], client[1]) if client is not None else None,
             headers=self.make_headers(),
             body=wsgi_input,
-            is_json=self.request_type == 'json',
-            is_xml=self.request_type == 'xml',
-            is_form=self.request_type == 'multipart' or self.request_type == 'form',
-            is_buffer=self.request_type is None
+            is_json=request_type == 'json',
+            is_xml=request_type == 'xml',
+            is_form=request_type == 'multipart' or request_type == 'form',
+            is_buffer=request_type is None
         )
         return request
 
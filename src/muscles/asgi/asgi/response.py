@@ -8,9 +8,66 @@ from .request import Request
 from ..__about__ import __version__, __name__
 import mimetypes
 from muscles.core import BaseModel, Collection
-from .http_code import code_status
+from .http_code import code_status, status_line
 from .error_handler import ApplicationException
 from .error_handler import ErrorsException
+from .error_handler import LazyTraceback
+
+
+#: Заголовок Server всех ответов
+SERVER_HEADER = ('Server', ' '.join([__name__, __version__]))
+#: Заголовок Content-Type ответов JSON
+JSON_CONTENT_TYPE = ('Content-Type', 'application/json; charset=utf-8')
+#: Имена частых заголовков в виде ASGI
+_HEADER_NAMES = {
+    name: name.lower().encode('latin-1') for name in (
+        'Content-Type', 'Content-Length', 'Content-Encoding', 'Content-Disposition', 'Server', 'Location',
+        'Set-Cookie', 'Cache-Control', 'ETag', 'Last-Modified', 'Access-Control-Allow-Origin',
+        'Access-Control-Allow-Methods', 'Access-Control-Allow-Headers',
+    )
+}
+#: Постоянные заголовки, закодированные заранее
+_ENCODED_HEADERS = {
+    SERVER_HEADER: (b'server', SERVER_HEADER[1].encode('latin-1')),
+    JSON_CONTENT_TYPE: (b'content-type', JSON_CONTENT_TYPE[1].encode('latin-1')),
+}
+
+
+def is_stream(body) -> bool:
+    """
+    Тело ответа - итератор блоков bytes, обычный или асинхронный (например генератор).
+    Такое тело отправляется по блокам, без Content-Length
+
+    :param body: Тело ответа
+    :return: bool
+    """
+    return hasattr(body, '__next__') or hasattr(body, '__anext__')
+
+
+def encode_headers(headers) -> list:
+    """
+    Заголовки ответа в виде ASGI: имена в нижнем регистре, имена и значения в bytes
+
+    :param headers: Список пар (имя, значение)
+    :return: list(tuple(bytes, bytes))
+    """
+    result = []
+    for header in headers:
+        encoded = _ENCODED_HEADERS.get(header) if isinstance(header, tuple) else None
+        if encoded is None:
+            name, value = header
+            if isinstance(name, str):
+                name = _HEADER_NAMES.get(name) or name.lower().encode('latin-1')
+            if isinstance(value, str):
+                try:
+                    value = value.encode('latin-1')
+                except UnicodeEncodeError:
+                    value = value.encode('utf-8')
+            elif not isinstance(value, bytes):
+                value = str(value).encode('latin-1')
+            encoded = (name, value)
+        result.append(encoded)
+    return result
 
 
 class ObjectJSONEncoder(JSONEncoder):
@@ -18,15 +75,29 @@ class ObjectJSONEncoder(JSONEncoder):
         return str(obj)
 
 
+def _json_default(obj):
+    """
+    Сериализация объектов, которые json не умеет кодировать сам
+
+    :param obj: Объект
+    :return:
+    """
+    if isinstance(obj, (BaseModel, Collection)):
+        return obj.to_json()
+    return str(obj)
+
+
 class BaseResponse:
 
-    _headers: list[tuple] = []
-    _reason: Union[str, None] = None
-    request: Union[Request, None] = None
-    _status: Union[str, int, None] = None
-    _body: Union[BaseModel, str, int, tuple, dict, list, bytes, bool, None] = None
-    _errors: Union[BaseModel, str, int, tuple, dict, list, bytes, bool, None] = None
-    _file: Union[str, None] = None
+    __slots__ = ('_headers', '_reason', 'request', '_status', '_body', '_errors', '_file', 'trace')
+
+    _headers: list[tuple]
+    _reason: Union[str, None]
+    request: Union[Request, None]
+    _status: Union[str, int, None]
+    _body: Union[BaseModel, str, int, tuple, dict, list, bytes, bool, None]
+    _errors: Union[BaseModel, str, int, tuple, dict, list, bytes, bool, None]
+    _file: Union[str, None]
 
     def __init__(self, *args,
                  status: Union[str, int, None] = None,
@@ -41,8 +112,7 @@ class BaseResponse:
             reason = None
         if headers is None:
             headers = []
-        if request is not None:
-            self.request = request
+        self.request = request
         if trace is None:
             trace = None
         self.trace = trace
@@ -134,6 +204,16 @@ class BaseResponse:
             return str(200)
         return str(self._status)
 
+    @property
+    def status_code(self) -> int:
+        """
+        Код статуса ответа числом, для сообщения http.response.start
+        :return: int
+        """
+        if self._status is None:
+            return 200
+        return self._status if isinstance(self._status, int) else int(self._status)
+
     @property
     def headers(self):
         def _condition(header):
@@ -165,11 +245,13 @@ class BaseResponse:
             # save decompress tar.gz files.
             if encoding is not None:
                 headers.append(("Content-Encoding", encoding))
+        elif is_stream(self._body):
+            headers.append(('Content-Type', content_type))
         elif self.body:
             headers.append(('Content-Length', str(len(self.make_body()))))
             headers.append(('Content-Type', content_type))
 
-        headers.append(('Server', str(' '.join([__name__, __version__]))))
+        headers.append(SERVER_HEADER)
 
         if not any(item[0] == "Content-Type" for item in headers):
             headers.append(('Content-Type', 'text/html; charset=utf-8'))
@@ -219,7 +301,8 @@ class BaseResponse:
             response_type = "json"
         elif isinstance(body, dict):
             response_type = "json"
-        elif isinstance(body, list):
+        elif isinstance(body, list) or isinstance(body, LazyTraceback):
+            # LazyTraceback - список строк трассировки, который форматируется в make_body
             response_type = "json"
         elif body is None or body == '':
             response_type = "text"
@@ -319,12 +402,16 @@ class BaseResponse:
         :return: string
         """
         reason = self.reason
-        if reason is None and self.status in code_status:
-            reason = code_status[self.status]['message']
+        if not reason:
+            line = status_line.get(self.status_code)
+            if line is not None:
+                return line
         return '%s %s' % (self.status, reason.decode('utf8') if isinstance(reason, bytes) else reason)
 
 
 class Response(BaseResponse):
+    __slots__ = ()
+
     def make_body(self):
         def _recursive_dict_adapt(dictionary):
             if isinstance(dictionary, dict):
@@ -438,6 +525,8 @@ class Response(BaseResponse):
 
 
 class BadResponse(Response):
+    __slots__ = ()
+
     def make_body(self):
         def _recursive_dict_adapt(dictionary):
             if isinstance(dictionary, dict):
@@ -458,6 +547,11 @@ class BadResponse(Response):
         body = self.body
         trace = self.trace
         errors = self.errors
+        # Трассировки форматируются только здесь, когда ответ действительно отправляется
+        if isinstance(body, LazyTraceback):
+            body = body.format()
+        if isinstance(trace, LazyTraceback):
+            trace = trace.format()
         if self.type in ['json']:
             try:
                 status = self.status
@@ -529,7 +623,63 @@ class BadResponse(Response):
         }
 
 
+class JsonResponse(BaseResponse):
+    """
+    Ответ JSON: тело кодируется один раз, без разбора типа и обхода данных
+    """
+    __slots__ = ('_encoded',)
+
+    def __init__(self, data=None, status: Union[str, int] = 200, headers: list[tuple] = None,
+                 request: Union[Request, None] = None):
+        super().__init__(status=status, body=data, headers=headers, request=request)
+        self._encoded = None
+
+    def make_body(self):
+        if self._encoded is None:
+            try:
+                self._encoded = json.dumps(self._body, default=_json_default).encode('utf-8')
+            except Exception as e:
+                raise ApplicationException(status=500, reason=e, body=traceback.format_exc())
+        return self._encoded
+
+    @BaseResponse.body.setter
+    def body(self, value):
+        self._body = value
+        self._encoded = None
+
+    @property
+    def type(self):
+        return "json"
+
+    @property
+    def headers(self):
+        headers = [(str(header[0]), str(header[1])) for header in self._headers
+                   if header[0] != 'Content-Length' and header[0] != 'Content-Type']
+        headers.append(('Content-Length', str(len(self.make_body()))))
+        headers.append(JSON_CONTENT_TYPE)
+        headers.append(SERVER_HEADER)
+        return headers
+
+    @headers.setter
+    def headers(self, headers):
+        self._headers = headers
+
+
+def json_response(data, status: Union[str, int] = 200, headers: list[tuple] = None,
+                  request: Union[Request, None] = None) -> JsonResponse:
+    """
+    Формирует ответ JSON
+    :param data: Данные ответа
+    :param status: HTTP Код статуса ответа
+    :param headers: Заголовки ответа
+    :param request: Объект запроса
+    :return: JsonResponse
+    """
+    return JsonResponse(data, status=status, headers=headers, request=request)
+
+
 class MakeResponse:
+    __slots__ = ('response',)
 
     def __init__(self, response: BaseResponse):
         self.response = response
@@ -546,6 +696,10 @@ class MakeResponse:
     def status(self):
         return self.response.status
 
+    @property
+    def status_code(self):
+        return self.response.status_code
+
     @property
     def headers(self):
         return self.response.headers
@@ -1,6 +1,10 @@
+from collections import OrderedDict
 from functools import wraps
 import re
 import os
+import sys
+import importlib
+import warnings
 from abc import ABC
 from urllib.parse import unquote
 from .response import Response
@@ -8,18 +12,55 @@ from muscles.core import Schema
 from muscles.core import BaseSecurity
 from muscles.core import GuestUser
 from muscles.core import Itinerary
+from muscles.core import normalize_path
 from .error_handler import ForbiddenException
 
+#: Заморозка таблиц маршрутов (MUSCLES_ASGI_FREEZE=0 отключает, например для разработки)
+FREEZE_ROUTES = os.environ.get('MUSCLES_ASGI_FREEZE', '1') != '0'
+#: Размер кэша найденных маршрутов на один HTTP метод
+RESOLVE_CACHE_SIZE = 1024
+#: Пути длиннее этого значения не кэшируются
+RESOLVE_CACHE_MAX_PATH = 256
+#: Content-Type запроса без заголовка, см. Request.content_type
+DEFAULT_CONTENT_TYPE = 'text/html'
+#: Модуль снимка таблиц маршрутов, собранного muscles.asgi.compile_routes
+COMPILED_ROUTES = os.environ.get('MUSCLES_ASGI_COMPILED_ROUTES')
+
+_PLACEHOLDER = re.compile(r"^\{[^\}]+\}$")
+
+
+def _route_path_key(route):
+    """
+    Ключ индекса маршрутов по пути, как у Itinerary._routes_by_path
+
+    :param route: Путь маршрута
+    :return: str
+    """
+    return normalize_path(route).lower()
+
 
 class RouteRule(ABC):
     """
     Базовое правило обработки патернов роута
     """
     name = ''
+    #: Регулярное выражение значения части пути, None если правило не описывается выражением
+    regex = None
+    #: Скомпилированный шаблон значения части пути
+    pattern = None
 
     def is_match(self, match, chunk):
         pass
 
+    def segment(self, chunk):
+        """
+        Регулярное выражение для части пути узла, используется при компиляции роутера
+
+        :param chunk: Часть пути узла
+        :return: str или None, если часть пути нельзя описать выражением
+        """
+        return self.regex
+
     def compile(self, val):
         return str(val)
 
@@ -34,10 +75,13 @@ class RouteRuleDefault(RouteRule):
     name = 'default'
 
     def is_match(self, val, chunk):
-        if not re.search(r"^\{[^\}]+\}$", val) and val == chunk:
+        if not _PLACEHOLDER.search(val) and val == chunk:
             return True
         return False
 
+    def segment(self, chunk):
+        return None if _PLACEHOLDER.search(chunk) else re.escape(chunk)
+
     def param(self, val):
         return str(val)
 
@@ -50,9 +94,11 @@ class RouteRuleVar(RouteRule):
     Правил обработки роута - разрешенные символы
     """
     name = 'var'
+    regex = r"[\w\d\%\_\-]+"
+    pattern = re.compile(r"^(%s)$" % regex)
 
     def is_match(self, val, chunk):
-        return True if re.search(r"^([\w\d\%\_\-]+)$", val) else False
+        return True if self.pattern.search(val) else False
 
     def param(self, val):
         return str(val)
@@ -66,9 +112,11 @@ class RouteRuleInt(RouteRule):
     Правил обработки роута - цифры
     """
     name = 'int'
+    regex = r"[\d]+"
+    pattern = re.compile(r"^(%s)$" % regex)
 
     def is_match(self, val, chunk):
-        return True if re.search(r"^([\d]+)$", val) else False
+        return True if self.pattern.search(val) else False
 
     def param(self, val):
         return int(val)
@@ -82,9 +130,11 @@ class RouteRuleFloat(RouteRule):
     Правил обработки роута - цифра с плавающей точкой
     """
     name = 'float'
+    regex = r"[\d]+\.[\d]+"
+    pattern = re.compile(r"^(%s)$" % regex)
 
     def is_match(self, val, chunk):
-        return True if re.search(r"^([\d]+\.[\d]+)$", val) else False
+        return True if self.pattern.search(val) else False
 
     def param(self, val):
         return float(val)
@@ -757,11 +807,395 @@ class Node(ABC):
         self.parent = parent
 
 
+class RouteTable:
+    """
+    Замороженная таблица маршрутов одного роутера
+    """
+
+    def __init__(self, instance, key=None):
+        """
+        :param instance: Объект роутера
+        :param key: Ключ роутера из Itinerary.instance_list
+        """
+        self.instance = instance
+        self.name = '%s.%s:%s' % (type(instance).__module__, type(instance).__qualname__, key[1] if key else None)
+        self.size = len(instance.nodes_map)
+        # Роутеры с собственным get_current_route обрабатываем как есть
+        self.interpreted = type(instance).get_current_route is not Itinerary.get_current_route
+        self._candidates = {}
+        self._selected = {}
+        self.match = instance.match_with_params
+        self.source = None
+        self.static = {}
+        self.dispatch = {}
+
+    def is_stale(self):
+        """
+        Проверяет, добавлялись ли маршруты после заморозки
+
+        :return: bool
+        """
+        return self.size != len(self.instance.nodes_map)
+
+    def _terminals(self):
+        """
+        Конечные узлы дерева маршрутов в порядке обхода Itinerary._match
+
+        :return: list(list(Node)) - цепочки узлов от корня до конечного узла
+        """
+        keys = [route['key'] for route in self.instance.nodes_map]
+        chains = []
+
+        def walk(node, chain):
+            for child in node.childrens:
+                _chain = chain + [child]
+                if child.key in keys:
+                    chains.append(_chain)
+                walk(child, _chain)
+
+        walk(self.instance.node, [])
+        return chains
+
+    def _index(self, chain):
+        """
+        Позиции узлов цепочки среди дочерних узлов родителя
+
+        :param chain: Цепочка узлов от корня
+        :return: tuple(int)
+        """
+        index = []
+        parent = self.instance.node
+        for node in chain:
+            index.append(next(i for i, child in enumerate(parent.childrens) if child is node))
+            parent = node
+        return tuple(index)
+
+    def generate(self):
+        """
+        Описание функции поиска узла по пути: статические пути ищутся по словарю,
+        динамические - одним объединенным регулярным выражением
+
+        :return: dict - исходный код, выражение, статические пути и узлы, на которые ссылается код,
+            None если дерево содержит правила без выражения
+        """
+        static = ['/']
+        alternatives = []
+        nodes = {}
+        lines = [
+            'def match(path):',
+            '    hit = _static.get(path)',
+            '    if hit is not None:',
+            '        return hit',
+            '    m = _search(path)',
+            '    if m is None:',
+            '        return _fallback(path)',
+            '    name = m.lastgroup',
+        ]
+        for n, chain in enumerate(self._terminals()):
+            parts = []
+            params = []
+            dynamic = False
+            for i, node in enumerate(chain):
+                if not isinstance(node.rule, RouteRule):
+                    return None
+                segment = node.rule.segment(node.route)
+                if segment is None:
+                    return None
+                if not isinstance(node.rule, RouteRuleDefault):
+                    dynamic = True
+                if node.dictionary_key:
+                    group = 'p%d_%d' % (n, i)
+                    nodes['_' + group] = self._index(chain[:i + 1])
+                    params.append(group)
+                    segment = '(?P<%s>%s)' % (group, segment)
+                parts.append(segment)
+            if not dynamic:
+                static.append('/' + '/'.join(node.route for node in chain))
+                continue
+            nodes['_n%d' % n] = self._index(chain)
+            alternatives.append('(?P<n%d>/%s)' % (n, '/'.join(parts)))
+            lines.append("    if name == 'n%d':" % n)
+            lines.append('        dictionary = {}')
+            for group in reversed(params):
+                lines.append("        dictionary.update(_%s.dictionary(m.group('%s')))" % (group, group))
+            lines.append('        return _n%d, dictionary' % n)
+        lines.append('    return _fallback(path)')
+        return {
+            'size': self.size,
+            'source': '\n'.join(lines) + '\n',
+            'pattern': '|'.join(alternatives) or None,
+            'static': tuple(static),
+            'nodes': nodes,
+        }
+
+    def link(self, table):
+        """
+        Создает функцию поиска узла по описанию из generate или из снимка
+
+        :param table: Описание функции поиска
+        :return: bool - удалось ли создать функцию
+        """
+        if not table or table['size'] != self.size:
+            return False
+        fallback = self.instance.match_with_params
+        static = {sys.intern(path): fallback(path) for path in table['static']}
+        scope = {'_static': static, '_fallback': fallback}
+        try:
+            for name, index in table['nodes'].items():
+                node = self.instance.node
+                for i in index:
+                    node = node.childrens[i]
+                scope[name] = node
+            scope['_search'] = re.compile(table['pattern']).fullmatch if table['pattern'] else lambda path: None
+            exec(compile(table['source'], '<routes>', 'exec'), scope)
+        except Exception:
+            return False
+        self.source = table['source']
+        self.match = scope['match']
+        self.static = static
+        self.dispatch = self._build_dispatch(static)
+        return True
+
+    def compile(self, snapshot=None):
+        """
+        Компилирует функцию поиска узла по пути
+
+        :param snapshot: Описание из снимка compile_routes, используется если совпадает с деревом
+        :return: bool - удалось ли скомпилировать
+        """
+        if snapshot is not None and self.link(snapshot):
+            return True
+        return self.link(self.generate())
+
+    def _build_dispatch(self, static):
+        """
+        Таблица статических маршрутов по (METHOD, путь). Ключ ('*', путь) хранит маршруты
+        для методов, которые явно не указаны ни в одном маршруте пути
+
+        :param static: Словарь путь -> (узел, параметры)
+        :return: dict
+        """
+        dispatch = {}
+        for path, (node, dictionary) in static.items():
+            if node is None:
+                continue
+            routes, methods, content_types = self.candidates(node)
+            for method in {'*'} | set(methods):
+                dispatch[(method, path)] = (dictionary,) + self.select(node, method)
+        return dispatch
+
+    def candidates(self, node):
+        """
+        Маршруты узла в порядке регистрации, выбираются так же, как в Itinerary.get_current_route.
+        Поля хранятся параллельными кортежами, чтобы проверка метода и типа контента
+        не разбирала словари маршрутов
+
+        :param node: Узел дерева маршрутов
+        :return: (маршруты, методы, типы контента)
+        """
+        candidates = self._candidates.get(node)
+        if candidates is None:
+            instance = self.instance
+            routes = tuple(
+                node.route_records
+                or instance._routes_by_path.get(_route_path_key(node.full_route or ''))
+                or (instance._routes_by_key.get(node.key, []) if node.key is not None else [])
+            )
+            candidates = (
+                routes,
+                tuple(sys.intern((route['method'] or '*').upper()) for route in routes),
+                tuple(sys.intern((route['content_type'] or '*/*').lower()) for route in routes),
+            )
+            self._candidates[node] = candidates
+        return candidates
+
+    def select(self, node, method):
+        """
+        Маршруты узла, подходящие для метода
+
+        :param node: Узел дерева маршрутов
+        :param method: HTTP метод в верхнем регистре
+        :return: (маршруты, типы контента)
+        """
+        routes, methods, content_types = self.candidates(node)
+        if method not in methods:
+            method = '*'
+        selected = self._selected.get((node, method))
+        if selected is None:
+            index = [i for i, route_method in enumerate(methods) if route_method == '*' or route_method == method]
+            selected = tuple(routes[i] for i in index), tuple(content_types[i] for i in index)
+            self._selected[(node, method)] = selected
+        return selected
+
+    def resolve(self, request):
+        """
+        Находит маршрут запроса, аналог Itinerary.get_current_route
+
+        :param request: Объект запроса
+        :return: (маршрут, параметры)
+        """
+        if self.interpreted:
+            return self.instance.get_current_route(request)
+        return self.lookup(request.method.upper(), request.path, request.content_type.lower())
+
+    def lookup(self, method, path, content_type):
+        """
+        Находит маршрут по методу, пути и типу контента
+
+        :param method: HTTP метод в верхнем регистре
+        :param path: Путь запроса
+        :param content_type: Тип контента в нижнем регистре
+        :return: (маршрут, параметры)
+        """
+        hit = self.dispatch.get((method, path)) or self.dispatch.get(('*', path))
+        if hit is not None:
+            dictionary, routes, content_types = hit
+        else:
+            node, dictionary = self.match(path)
+            if node is None:
+                return None, ()
+            routes, content_types = self.select(node, method)
+        for i, route_content_type in enumerate(content_types):
+            if route_content_type == '*/*' or route_content_type == content_type:
+                return routes[i], dictionary
+        return None, dictionary
+
+
 class Routes(Itinerary):
     """
     Класс роутера
     """
-    pass
+
+    def freeze(self):
+        """
+        Замораживает таблицы маршрутов всех роутеров
+
+        :return: tuple(RouteTable)
+        """
+        self._tables = tuple(RouteTable(instance, key) for key, instance in self.instance_list())
+        self._cache = {}
+        # Методы, явно указанные в маршрутах; остальные ищутся и кэшируются как '*'
+        self._methods = frozenset(
+            (route['method'] or '*').upper() for table in self._tables for route in table.instance.nodes_map
+        )
+        self.compile_jit()
+        # Кэшировать можно, только если результат зависит лишь от метода, пути и типа контента
+        self._cacheable = not any(table.interpreted for table in self._tables)
+        if self._cacheable:
+            self._preload()
+        return self._tables
+
+    def _preload(self):
+        """
+        Заполняет кэш статическими маршрутами с явно указанным методом
+
+        :return:
+        """
+        for table in self._tables:
+            for path, (node, dictionary) in table.static.items():
+                if node is None:
+                    continue
+                routes, methods, content_types = table.candidates(node)
+                for method in methods:
+                    if method != '*':
+                        self._resolve(method, path, DEFAULT_CONTENT_TYPE)
+
+    def compile_jit(self):
+        """
+        Компилирует функции поиска маршрутов замороженных таблиц
+
+        :return:
+        """
+        snapshot = {}
+        if COMPILED_ROUTES:
+            try:
+                snapshot = importlib.import_module(COMPILED_ROUTES).TABLES
+            except (ImportError, AttributeError) as e:
+                warnings.warn('Снимок маршрутов %s не загружен: %s' % (COMPILED_ROUTES, e))
+        for table in getattr(self, '_tables', ()):
+            table.compile(snapshot.get(table.name))
+
+    def snapshot(self):
+        """
+        Описания функций поиска всех роутеров для снимка compile_routes
+
+        :return: dict
+        """
+        return {table.name: table.generate() for table in self.freeze()}
+
+    def get_current_static(self, request):
+        """
+        Возвращает обработчик статических файлов, аналог Itinerary.get_current_static,
+        путь запроса приводится к нижнему регистру один раз, а не для каждого каталога
+
+        :param request: Объект запроса
+        :return:
+        """
+        if not self.static_map:
+            return None
+        path = request.path.lower()
+        for static in self.static_map:
+            if not static['prefix'] or path.startswith(static['prefix'] + '/'):
+                return static
+        return None
+
+    def resolve(self, request):
+        """
+        Находит маршрут запроса среди всех роутеров
+
+        :param request: Объект запроса
+        :return: (роутер, маршрут, параметры)
+        """
+        if not FREEZE_ROUTES:
+            for key, instance in self.instance_list():
+                call, dictionary = instance.get_current_route(request)
+                if call:
+                    return instance, call, dictionary
+            return None, None, {}
+
+        tables = getattr(self, '_tables', None)
+        if tables is None or len(tables) != len(self.instance_list()) or any(t.is_stale() for t in tables):
+            tables = self.freeze()
+        if not self._cacheable:
+            for table in tables:
+                call, dictionary = table.resolve(request)
+                if call:
+                    return table.instance, call, dictionary
+            return None, None, {}
+        return self._resolve(request.method.upper(), request.path, request.content_type.lower())
+
+    def _resolve(self, method, path, content_type):
+        """
+        Находит маршрут по замороженным таблицам через LRU кэш.
+        Кэшируются только найденные маршруты без параметров пути
+
+        :param method: HTTP метод в верхнем регистре
+        :param path: Путь запроса
+        :param content_type: Тип контента в нижнем регистре
+        :return: (роутер, маршрут, параметры)
+        """
+        if method not in self._methods:
+            # Метод, которого нет ни в одном маршруте, выбирает те же маршруты, что и '*',
+            # поэтому произвольные методы клиентов не создают новых кэшей
+            method = '*'
+        cache = self._cache.get(method)
+        if cache is None:
+            cache = self._cache[method] = OrderedDict()
+        key = (path, content_type)
+        hit = cache.get(key)
+        if hit is not None:
+            cache.move_to_end(key)
+            return hit
+        for table in self._tables:
+            call, dictionary = table.lookup(method, path, content_type)
+            if call:
+                result = table.instance, call, dictionary
+                if not dictionary and len(path) <= RESOLVE_CACHE_MAX_PATH:
+                    cache[key] = result
+                    if len(cache) > RESOLVE_CACHE_SIZE:
+                        cache.popitem(last=False)
+                return result
+        return None, None, {}
 
 
 class Api(Itinerary):
@@ -788,3 +1222,16 @@ routes.add_rule(RouteRuleDefault())
 routes.add_rule(RouteRuleVar())
 routes.add_rule(RouteRuleInt())
 routes.add_rule(RouteRuleFloat())
+
+
+def warmup():
+    """
+    Заранее замораживает и компилирует таблицы маршрутов, чтобы первый запрос не платил за это.
+    Вызывается при lifespan.startup или в главном процессе до fork воркеров,
+    тогда воркеры разделяют готовые таблицы через copy-on-write
+
+    :return: tuple(RouteTable)
+    """
+    if not FREEZE_ROUTES:
+        return ()
+    return routes.freeze()
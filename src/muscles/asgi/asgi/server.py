@@ -1,14 +1,17 @@
 import os
 import io
-import traceback
-from pprint import pprint
+import asyncio
+import logging
+import stat
+from email.utils import formatdate, parsedate_to_datetime
 
 from muscles.core import NotFoundException, ApplicationException, ErrorException
 from muscles.core import AttributeErrorException
-from muscles.core import inject, EventsStorageInterface
-from .request import RequestMaker
-from .response import MakeResponse, BaseResponse, BadResponse
-from .routers import routes, itinerary
+from muscles.core import DependencyStorage, EventsStorageInterface
+from .request import RequestMaker, DEFAULT_CHUNK_SIZE
+from .error_handler import LazyTraceback
+from .response import BaseResponse, BadResponse, json_response, encode_headers, is_stream
+from .routers import routes, itinerary, warmup
 from urllib.parse import unquote
 
 MAX_LINE = 64 * 1024
@@ -16,6 +19,159 @@ MAX_HEADERS = 100
 TIMEOUT = 2
 MAX_CONNECTIONS = 1000
 
+log = logging.getLogger(__name__)
+
+#: Признак отсутствующего атрибута ошибки в send_error
+_MISSING = object()
+#: Хранилище событий, разрешается один раз на процесс, см. _events_storage
+_events = None
+#: Ответ на CORS preflight без маршрутизации и обработчиков, по умолчанию выключен:
+#: preflight проходит через приложение (MUSCLES_ASGI_PREFLIGHT=1 включает)
+FAST_PREFLIGHT = os.environ.get('MUSCLES_ASGI_PREFLIGHT', '0') == '1'
+#: Заголовки ответа на CORS preflight, обработчики before_response могут их дополнить
+CORS_HEADERS = [
+    ('Access-Control-Allow-Origin', '*'),
+    ('Access-Control-Allow-Methods', 'GET, POST, PUT, PATCH, DELETE, OPTIONS'),
+    ('Access-Control-Allow-Headers', '*'),
+]
+
+#: Ошибки обработчика маршрута: класс исключения -> (статус, класс ошибки ответа, шаблон причины)
+_HANDLER_ERRORS = {
+    ApplicationException: (400, ApplicationException, None),
+    ErrorException: (500, ApplicationException, None),
+    ImportError: (500, ApplicationException, None),
+    KeyError: (500, AttributeErrorException, "KeyError[%s]"),
+}
+#: Правило для исключений, которых нет в _HANDLER_ERRORS
+_HANDLER_ERROR_DEFAULT = (500, ApplicationException, None)
+
+
+def _wrap_handler_error(ae):
+    """
+    Оборачивает исключение обработчика маршрута в ошибку ответа.
+    Правило ищется по MRO, поэтому подклассы обрабатываются как их базовые классы
+
+    :param ae: Исключение
+    :return: ErrorException
+    """
+    for cls in type(ae).__mro__:
+        rule = _HANDLER_ERRORS.get(cls)
+        if rule is not None:
+            log.debug("%s", ae, exc_info=True)
+            break
+    else:
+        log.exception("%s", ae)
+        rule = _HANDLER_ERROR_DEFAULT
+    status, error_class, template = rule
+    reason = template % ae if template else ae
+    return error_class(status=status, reason=reason, body=None, traceback=LazyTraceback(ae.__traceback__))
+
+
+def _response_from_body(resp, request):
+    """
+    Ответ из строки, байтов или другого значения обработчика
+
+    :param resp: Результат обработчика
+    :param request: Объект запроса
+    :return: BaseResponse
+    """
+    return BaseResponse(status=200, body=resp, request=request)
+
+
+def _response_from_dict(resp, request):
+    """
+    Ответ JSON из словаря
+
+    :param resp: Результат обработчика
+    :param request: Объект запроса
+    :return: JsonResponse
+    """
+    return json_response(resp, request=request)
+
+
+def _response_from_tuple(resp, request):
+    """
+    Ответ из кортежа (тело, статус, заголовки), статус и заголовки необязательны
+
+    :param resp: Результат обработчика
+    :param request: Объект запроса
+    :return: BaseResponse
+    """
+    size = len(resp)
+    return BaseResponse(status=resp[1] if size > 1 else 200,
+                        body=resp[0] if size > 0 else None,
+                        headers=resp[2] if size > 2 else None,
+                        request=request)
+
+
+#: Преобразование результата обработчика маршрута в ответ по типу результата
+_RESPONSE_CONVERTERS = {
+    str: _response_from_body,
+    bytes: _response_from_body,
+    dict: _response_from_dict,
+    tuple: _response_from_tuple,
+}
+
+
+def _make_response(resp, request):
+    """
+    Формирует ответ из результата обработчика маршрута, который не является BaseResponse.
+    Подклассы типов из _RESPONSE_CONVERTERS ищутся через isinstance
+
+    :param resp: Результат обработчика
+    :param request: Объект запроса
+    :return: BaseResponse
+    """
+    convert = _RESPONSE_CONVERTERS.get(type(resp))
+    if convert is None:
+        for cls, converter in _RESPONSE_CONVERTERS.items():
+            if isinstance(resp, cls):
+                convert = converter
+                break
+        else:
+            convert = _response_from_body
+    return convert(resp, request)
+
+
+def _events_storage():
+    """
+    Возвращает хранилище событий. AsgiStrategy создает сервер на каждый вызов ASGI,
+    поэтому хранилище разрешается при первом обращении и переиспользуется всеми серверами
+
+    :return: EventsStorageInterface
+    """
+    global _events
+    if _events is None:
+        _events = DependencyStorage().get(EventsStorageInterface)
+    return _events
+
+
+def _not_modified(headers, etag, mtime):
+    """
+    Проверяет условные заголовки запроса статического файла
+
+    :param headers: Заголовки запроса
+    :param etag: ETag файла
+    :param mtime: Время изменения файла
+    :return: bool - можно ответить 304 без тела
+    """
+    if_none_match = headers.get('If-None-Match')
+    if if_none_match is not None:
+        # If-Modified-Since не учитывается, если есть If-None-Match (RFC 9110, 13.1.3)
+        if if_none_match.strip() == '*':
+            return True
+        tags = [tag.strip() for tag in if_none_match.split(',')]
+        # Слабое сравнение: W/ не учитывается
+        return etag[2:] in [tag[2:] if tag.startswith('W/') else tag for tag in tags]
+    if_modified_since = headers.get('If-Modified-Since')
+    if if_modified_since is not None:
+        try:
+            since = parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+        return int(mtime) <= since.timestamp()
+    return False
+
 
 class Transport:
     """
@@ -23,12 +179,14 @@ class Transport:
     """
 
     server = None
+    events = None
 
     def __init__(self):
         pass
 
     def init_server(self, server):
         self.server = server
+        self.events = server.events
 
     def make_response(self, response):
         pass
@@ -36,6 +194,15 @@ class Transport:
     def make_request(self):
         pass
 
+    def send_file(self, response, path):
+        pass
+
+    def send_empty(self, response):
+        pass
+
+    def send_stream(self, body):
+        pass
+
 
 class AsgiTransport(Transport):
     """
@@ -64,6 +231,8 @@ class AsgiTransport(Transport):
         :param send: Sender
         :return:
         """
+        if scope['type'] == 'lifespan':
+            return await self._serve_lifespan(receive)
 
         request = await self.make_request(scope, receive, send)
 
@@ -71,81 +240,179 @@ class AsgiTransport(Transport):
             raise ApplicationException(status=400, reason='Bad request', body='Malformed request line')
         return await self.server.handler(request)
 
-    @inject(EventsStorageInterface)
-    async def make_response(self, response: BaseResponse, evnetStorage: EventsStorageInterface):
+    async def make_response(self, response: BaseResponse):
         """
         Отправляем ответ
         :param response: объект ответа
-        :param evnetStorage: EventsStorageInterface
         :return:
         """
+        serve = self._scope_handlers.get(self.scope['type'])
+        if serve is None:
+            return
         try:
-            print('response', response)
-            print('self.scope', self.scope)
-            if self.scope['type'] == 'lifespan':
-                message = response.request.body
-
-                if message is not None and message['type'] == 'lifespan.startup':
-                    # Выполняем инициализацию ресурсов
-                    print("STARTUP")
-                    await self.send({"type": "lifespan.startup.complete"})
-
-                elif message is not None and message['type'] == 'lifespan.shutdown':
-                    # Освобождаем ресурсы
-                    print("SHUTDOWN")
-                    await self.send({"type": "lifespan.shutdown.complete"})
+            return await serve(self, response)
+        except Exception as ae:
+            log.exception("%s", ae)
+            raise ApplicationException(status=500, reason=ae, body=LazyTraceback(ae.__traceback__))
+
+    async def _serve_lifespan(self, receive):
+        """
+        Отвечаем на сообщения жизненного цикла. Сообщения читаются из receive до lifespan.shutdown,
+        запрос и ответ для них не формируются
+        :param receive: receive
+        :return:
+        """
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                # Выполняем инициализацию ресурсов
+                log.debug("lifespan startup")
+                try:
+                    warmup()
+                except Exception as ae:
+                    log.exception("%s", ae)
+                    await self.send({"type": "lifespan.startup.failed", "message": str(ae)})
                     return
+                await self.send({"type": "lifespan.startup.complete"})
 
-            elif self.scope['type'] == 'http':
-                before_response = evnetStorage.get('before_response')
-                if before_response:
-                    for handler in before_response:
-                        response = handler(response)
-
-                # Обработка HTTP-запроса
-                if self.scope['method'] == 'OPTIONS':
-                    # Возвращаем корректные заголовки для CORS
-                    print("HTTP OPTIONS response:", response)
-                    response = MakeResponse(response=response)
-                    print("HTTP OPTIONS make_response:", response)
-                    print("HTTP STATUS:", response.status)
-                    print("HTTP HEADERS:", response.headers)
-                    print("HTTP BODY:", response.body)
-                    await self.send({
-                        'type': 'http.response.start',
-                        'status': 204,  # Нет контента
-                        'headers': response.headers,
-                    })
-                    await self.send({
-                        'type': 'http.response.body',
-                        'body': b'',
-                    })
-                else:
-                    print("HTTP response:", response)
-                    response = MakeResponse(response=response)
-                    print("HTTP make_response:", response)
-                    print("HTTP STATUS:", response.status)
-                    print("HTTP HEADERS >:", response.headers)
-                    print("HTTP BODY:", response.body)
-                    await self.send({
-                        'type': 'http.response.start',
-                        'status': int(response.status),
-                        'headers': response.headers
-                    })
-                    # Отправка тела ответа
-                    await self.send({
-                        'type': 'http.response.body',
-                        'body': response.body,
-                    })
-
-            elif self.scope['type'] == 'websocket':
-                # Обработка WebSocket-сообщений
-                raise Exception('WebSocket not implemented')
+            elif message['type'] == 'lifespan.shutdown':
+                # Освобождаем ресурсы
+                log.debug("lifespan shutdown")
+                await self.send({"type": "lifespan.shutdown.complete"})
+                return
 
-        except Exception as ae:
-            print(ae)
-            print(traceback.format_tb(ae.__traceback__))
-            raise ApplicationException(status=500, reason=ae, body=traceback.format_tb(ae.__traceback__))
+    async def _serve_http(self, response: BaseResponse):
+        """
+        Отправляем HTTP ответ
+        :param response: объект ответа
+        :return:
+        """
+        send = self.send
+        before_response = self.events.get('before_response')
+        if before_response:
+            for handler in before_response:
+                response = handler(response)
+
+        if self.scope.get('method') == 'OPTIONS':
+            # Возвращаем корректные заголовки для CORS, тело ответа 204 не отправляется
+            headers = [header for header in response.headers if header[0] != 'Content-Length']
+            if log.isEnabledFor(logging.DEBUG):
+                log.debug("http options status=204 headers=%s", headers)
+            await send({
+                'type': 'http.response.start',
+                'status': 204,  # Нет контента
+                'headers': encode_headers(headers),
+            })
+            await send({
+                'type': 'http.response.body',
+                'body': b'',
+            })
+        else:
+            headers = response.headers
+            if log.isEnabledFor(logging.DEBUG):
+                log.debug("http status=%s headers=%s", response.status, headers)
+            await send({
+                'type': 'http.response.start',
+                'status': response.status_code,
+                'headers': encode_headers(headers),
+            })
+            # Отправка тела ответа
+            body = response.make_body()
+            if is_stream(body):
+                await self.send_stream(body)
+            else:
+                await send({
+                    'type': 'http.response.body',
+                    'body': body,
+                })
+
+    async def _serve_websocket(self, response: BaseResponse):
+        """
+        Обработка WebSocket-сообщений
+        :param response: объект ответа
+        :return:
+        """
+        raise Exception('WebSocket not implemented')
+
+    #: Обработчики ответа по типу scope, lifespan обслуживается в handler без запроса и ответа
+    _scope_handlers = {
+        'http': _serve_http,
+        'websocket': _serve_websocket,
+    }
+
+    async def send_empty(self, response: BaseResponse):
+        """
+        Отправляем ответ без тела, например 304 Not Modified
+        :param response: объект ответа
+        :return:
+        """
+        send = self.send
+        await send({
+            'type': 'http.response.start',
+            'status': response.status_code,
+            'headers': encode_headers(response.headers),
+        })
+        await send({
+            'type': 'http.response.body',
+            'body': b'',
+        })
+
+    async def send_stream(self, body):
+        """
+        Отправляем тело ответа по блокам из итератора, не собирая его в памяти целиком
+        :param body: Итератор или асинхронный итератор блоков bytes
+        :return:
+        """
+        send = self.send
+        if hasattr(body, '__anext__'):
+            async for chunk in body:
+                if chunk:
+                    await send({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+        else:
+            for chunk in body:
+                if chunk:
+                    await send({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+        await send({'type': 'http.response.body', 'body': b'', 'more_body': False})
+
+    async def send_file(self, response: BaseResponse, path: str, size: int = None,
+                        chunk_size: int = DEFAULT_CHUNK_SIZE):
+        """
+        Отправляем файл ответа блоками, не загружая его в память целиком.
+        Открытие и чтение файла блокируют, поэтому выполняются в пуле потоков, а не в цикле событий
+        :param response: объект ответа
+        :param path: Путь к файлу
+        :param size: Размер файла для заголовка Content-Length
+        :param chunk_size: Размер блока
+        :return:
+        """
+        send = self.send
+        loop = asyncio.get_running_loop()
+        f = await loop.run_in_executor(None, io.open, path, 'rb')
+        try:
+            headers = response.headers
+            if size is not None:
+                headers.append(('Content-Length', str(size)))
+            await send({
+                'type': 'http.response.start',
+                'status': response.status_code,
+                'headers': encode_headers(headers),
+            })
+            while True:
+                chunk = await loop.run_in_executor(None, f.read, chunk_size)
+                if not chunk:
+                    break
+                await send({
+                    'type': 'http.response.body',
+                    'body': chunk,
+                    'more_body': True,
+                })
+        finally:
+            f.close()
+        await send({
+            'type': 'http.response.body',
+            'body': b'',
+            'more_body': False,
+        })
 
     async def make_request(self, scope, receive, send):
         """
@@ -158,14 +425,12 @@ class AsgiTransport(Transport):
         try:
             requestMaker = RequestMaker(scope, receive)
             return await requestMaker.make()
-        except ApplicationException as ae:
-            print(ae)
-            print(traceback.format_tb(ae.__traceback__))
-            raise ApplicationException(status=500, reason=ae, body=traceback.format_tb(ae.__traceback__))
+        except ApplicationException:
+            raise
         except Exception as ae:
-            print(ae)
-            print(traceback.format_tb(ae.__traceback__))
-            raise ApplicationException(status=500, reason=ae, body=traceback.format_tb(ae.__traceback__))
+            log.exception("%s", ae)
+            raise ApplicationException(status=500, reason=ae, body=None,
+                                       traceback=LazyTraceback(ae.__traceback__)) from ae
 
 
 class AsgiServer:
@@ -173,19 +438,42 @@ class AsgiServer:
     Объект сервера ASGI
     """
 
-    __transport_class = AsgiTransport
-    __transport = AsgiTransport
     __host = 'localhost'
     __port = 80
 
-    def __init__(self, host, port, error_handler):
+    def __init__(self, host, port, error_handler, transport_class=AsgiTransport):
         self.__host = host
         self.__port = port
+        # Обработчик ошибок создается в send_error, успешные запросы его не создают
         self.__error_handler = error_handler
+        self.__error_handler_instance = _MISSING
+        self.__events = _events_storage()
 
-        self.__transport = self.__transport_class()
+        self.__transport_class = transport_class
+        self.__transport = transport_class()
         self.__transport.init_server(self)
 
+    @property
+    def events(self):
+        """
+        Хранилище событий before_request/before_response
+        :return: EventsStorageInterface
+        """
+        return self.__events
+
+    @staticmethod
+    def __init_error_handler(error_handler):
+        """
+        Создаем обработчик ошибок один раз на сервер, а не на каждую ошибку
+        :param error_handler: Класс или объект обработчика ошибок
+        :return: Объект с методом handler или None
+        """
+        if isinstance(error_handler, type):
+            error_handler = error_handler()
+        if callable(getattr(error_handler, 'handler', None)):
+            return error_handler
+        return None
+
     def init_transport(self, transport):
         """
         Инициализируем транспортный протокол
@@ -203,12 +491,7 @@ class AsgiServer:
         :param kwargs:
         :return:
         """
-        try:
-            return self.__transport.execute(*args, **kwargs)
-        except Exception as ex:
-            print("Error: ", ex)
-            print(traceback.format_tb(ex.__traceback__))
-            return self.send_error(ex)
+        return self.__transport.execute(*args, **kwargs)
 
     async def handler(self, request):
         """
@@ -216,28 +499,30 @@ class AsgiServer:
         :param request: Запрос к серверу
         :return:
         """
-        headers = []
         if request.is_exception:
             return await self.send_error(request.exception, request)
         static = routes.get_current_static(request)
         if static:
-            return self.handle_static(static, request)
+            return await self.handle_static(static, request)
         else:
             return await self.handle_request(request)
 
-    @inject(EventsStorageInterface)
-    async def handle_request(self, request, evnetStorage: EventsStorageInterface):
+    async def handle_request(self, request):
         """
         Обработчик запроса к серверу
         :param request: Объект запроса
         :return:
         """
+        if FAST_PREFLIGHT and request.method == 'OPTIONS' and request.type == 'http' \
+                and 'Access-Control-Request-Method' in request.headers:
+            resp = BaseResponse(status=204, headers=list(CORS_HEADERS), request=request)
+            return await self.__transport.make_response(resp)
         try:
             if request.type == 'lifespan' or request.type is None:
                 resp = BaseResponse(status=200, body=None, request=request)
                 return await self.__transport.make_response(resp)
 
-            before_request = evnetStorage.get('before_request')
+            before_request = self.__events.get('before_request')
             if before_request:
                 for handler in before_request:
                     resp = handler(request)
@@ -246,35 +531,21 @@ class AsgiServer:
                             resp = BaseResponse(status=200, body=resp, request=request)
                         return await self.__transport.make_response(resp)
 
-            for key, instance in itinerary.instance_list():
-                call, dictionary = instance.get_current_route(request)
-                if call:
-                    request.route = call
-                    request.itinerary = instance
-                    if 'instance' in call.keys():
-                        for func in call['instance'].get_event('before_request'):
-                            func(request)
-                    break
+            instance, call, dictionary = routes.resolve(request)
+            if call:
+                request.route = call
+                request.itinerary = instance
+                if 'instance' in call:
+                    for func in call['instance'].get_event('before_request'):
+                        func(request)
 
         except ErrorException as ae:
-            print(ae)
-            print(traceback.format_tb(ae.__traceback__))
-            ae.body = traceback.format_tb(ae.__traceback__)
-            return await self.send_error(ae, request)
-        except ImportError as ae:
-            print(ae)
-            print(traceback.format_tb(ae.__traceback__))
-            ae = ApplicationException(status=500, reason=ae, body=traceback.format_tb(ae.__traceback__))
-            return await self.send_error(ae, request)
-        except KeyError as ae:
-            print(ae)
-            print(traceback.format_tb(ae.__traceback__))
-            ae = ApplicationException(status=500, reason=ae, body=traceback.format_tb(ae.__traceback__))
+            log.debug("%s", ae, exc_info=True)
+            ae.body = LazyTraceback(ae.__traceback__)
             return await self.send_error(ae, request)
         except Exception as ae:
-            print(ae)
-            print(traceback.format_tb(ae.__traceback__))
-            ae = ApplicationException(status=500, reason=ae, body=traceback.format_tb(ae.__traceback__))
+            log.exception("%s", ae)
+            ae = ApplicationException(status=500, reason=ae, body=LazyTraceback(ae.__traceback__))
             return await self.send_error(ae, request)
 
         if request.route:
@@ -287,61 +558,18 @@ class AsgiServer:
                                                         **dictionary)
                     else:
                         resp = request.route['handler'](request=request, **dictionary)
-                    if not isinstance(resp, BaseResponse) and isinstance(resp, str):
-                        resp = BaseResponse(status=200, body=resp, request=request)
-                    elif not isinstance(resp, BaseResponse) and isinstance(resp, bytes):
-                        resp = BaseResponse(status=200, body=resp, request=request)
-                    elif not isinstance(resp, BaseResponse) and isinstance(resp, dict):
-                        resp = BaseResponse(status=200, body=resp, request=request)
-                    elif not isinstance(resp, BaseResponse) and isinstance(resp, tuple):
-                        kwargs = {}
-                        status = 200
-                        if len(resp) >= 0:
-                            kwargs['body'] = resp[0]
-                        if len(resp) >= 1:
-                            status = resp[1]
-                        if len(resp) >= 2:
-                            kwargs['headers'] = resp[2]
-                        resp = BaseResponse(status=status, request=request, **kwargs)
-                    elif not isinstance(resp, BaseResponse):
-                        resp = BaseResponse(status=200, body=resp, request=request)
+                    if not isinstance(resp, BaseResponse):
+                        resp = _make_response(resp, request)
 
                     if hasattr(request.itinerary, 'modify_response'):
                         resp = request.itinerary.modify_response(resp)
 
-                    headers = []
-                    for header in resp.headers:
-                        headers.append('%s: %s' % (header[0], header[1]))
-
                     return await self.__transport.make_response(resp)
-                except ApplicationException as ae:
-                    print(ae)
-                    print(traceback.format_tb(ae.__traceback__))
-                    ae = ApplicationException(status=400, reason=ae, body=None, traceback=traceback.format_tb(ae.__traceback__))
-                    return await self.send_error(ae, request)
-                except ErrorException as ae:
-                    print(ae)
-                    print(traceback.format_tb(ae.__traceback__))
-                    ae = ApplicationException(status=500, reason=ae, body=None, traceback=traceback.format_tb(ae.__traceback__))
-                    return await self.send_error(ae, request)
-                except ImportError as ae:
-                    print(ae)
-                    print(traceback.format_tb(ae.__traceback__))
-                    ae = ApplicationException(status=500, reason=ae, body=None, traceback=traceback.format_tb(ae.__traceback__))
-                    return await self.send_error(ae, request)
-                except KeyError as ae:
-                    print(ae)
-                    print(traceback.format_tb(ae.__traceback__))
-                    ae = AttributeErrorException(status=500, reason="KeyError[%s]" % ae, body=None, traceback=traceback.format_tb(ae.__traceback__))
-                    return await self.send_error(ae, request)
                 except Exception as ae:
-                    print(ae)
-                    print(traceback.format_tb(ae.__traceback__))
-                    ae = ApplicationException(status=500, reason=ae, body=None, traceback=traceback.format_tb(ae.__traceback__))
-                    return await self.send_error(ae, request)
+                    return await self.send_error(_wrap_handler_error(ae), request)
         return await self.send_error(NotFoundException(status=404, reason="Not Found"), request)
 
-    def handle_static(self, static, request):
+    async def handle_static(self, static, request):
         """
         Обработчик статических файлов
         :param static: Путь к диреткории с файлами
@@ -351,23 +579,44 @@ class AsgiServer:
         path = request.path.replace(static['prefix'] + '/', '', 1)
         resp_file = os.path.join(static['directory'], unquote(path))
 
-        if not os.path.isfile(resp_file):
-            raise NotFoundException(status=404, reason='Not found')
         try:
-            resp = BaseResponse(status=200, file=resp_file, request=request)
+            st = os.stat(resp_file)
+        except OSError:
+            st = None
+        if st is None or not stat.S_ISREG(st.st_mode):
+            return await self.send_error(NotFoundException(status=404, reason='Not found'), request)
+
+        etag = 'W/"%x-%x"' % (st.st_mtime_ns, st.st_size)
+        validators = [('ETag', etag), ('Last-Modified', formatdate(st.st_mtime, usegmt=True))]
+        not_modified = _not_modified(request.headers, etag, st.st_mtime)
+        try:
+            if not_modified:
+                resp = BaseResponse(status=304, headers=validators, request=request)
+            else:
+                resp = BaseResponse(status=200, file=resp_file, headers=validators, request=request)
 
+            # Обработчик вызывается и для 304: он добавляет заголовки и может запретить доступ
             if static['handler'] is not None:
                 resp = static['handler'](resp)
-
-            headers = []
-            for header in resp.headers:
-                headers.append('%s: %s' % (header[0], header[1]))
-
-            self.__transport.send_header(resp.status, resp.headers)
-            with io.open(resp_file, "rb") as f:
-                yield f.read()
-        except Exception as e:
-            raise NotFoundException(status=404, reason='Not found')
+        except Exception as ae:
+            log.debug("%s", ae, exc_info=True)
+            return await self.send_error(NotFoundException(status=404, reason='Not found'), request)
+        if not isinstance(resp, BaseResponse):
+            resp = _make_response(resp, request)
+        if not_modified and resp.status_code == 304:
+            return await self.__transport.send_empty(resp)
+        file = getattr(resp, '_file', None)
+        if not file:
+            # Обработчик заменил ответ своим, например 403 при запрете доступа: файл не отправляется
+            return await self.__transport.make_response(resp)
+        size = st.st_size
+        if file != resp_file:
+            try:
+                size = os.stat(file).st_size
+            except OSError as ae:
+                log.debug("%s", ae, exc_info=True)
+                return await self.send_error(NotFoundException(status=404, reason='Not found'), request)
+        return await self.__transport.send_file(resp, file, size=size)
 
     async def send_error(self, err, request=None):
         """
@@ -376,24 +625,29 @@ class AsgiServer:
         :param request: Объект запроса
         :return:
         """
-        print('================ERROR/send_error>', err)
-        try:
-            status = err.status if hasattr(err, 'status') else 500
-            reason = err.reason if hasattr(err, 'reason') else str(err)
-            body = err.body if hasattr(err, 'body') else str(err)
-            trace = err.traceback if hasattr(err, 'traceback') else None
-        except Exception as e:
-            print("Error while handling error:", e)
-            status = 500
-            reason = b'Internal Server Error'
-            body = b'Internal Server Error'
-            trace = err.traceback if hasattr(err, 'traceback') else None
-        print('================ERROR/status/reason/body>', status, reason)
-        print("\n".join(body) if isinstance(body, list) else body)
-        print("\n".join(trace) if isinstance(trace, list) else trace)
-
-        if issubclass(self.__error_handler, Exception):
-            resp = self.__error_handler().handler(status=status, reason=reason, body=body, trace=trace, request=request)
+        status = getattr(err, 'status', 500)
+        reason = getattr(err, 'reason', _MISSING)
+        body = getattr(err, 'body', _MISSING)
+        trace = getattr(err, 'traceback', None)
+        if reason is _MISSING or body is _MISSING:
+            try:
+                text = str(err)
+            except Exception as e:
+                log.exception("Error while handling error: %s", e)
+                status = 500
+                text = b'Internal Server Error'
+            if reason is _MISSING:
+                reason = text
+            if body is _MISSING:
+                body = text
+        if log.isEnabledFor(logging.DEBUG):
+            log.debug("error status=%s reason=%s", status, reason)
+
+        if self.__error_handler_instance is _MISSING:
+            self.__error_handler_instance = self.__init_error_handler(self.__error_handler)
+        if self.__error_handler_instance is not None:
+            resp = self.__error_handler_instance.handler(status=status, reason=reason, body=body, trace=trace,
+                                                         request=request)
         else:
             resp = BadResponse(status=status, reason=reason, body=body, trace=trace, request=request)
         # traceback.print_exc(file=sys.stdout)
@@ -404,8 +658,4 @@ class AsgiServer:
             if call:
                 resp.body = call['handler'](resp, request)
                 break
-
-        headers = []
-        for header in resp.headers:
-            headers.append('%s: %s' % (header[0], header[1]))
         return await self.__transport.make_response(resp)
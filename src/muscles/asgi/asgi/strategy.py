@@ -1,12 +1,9 @@
 from typing import Optional
 
 from muscles.core import BaseStrategy
-from watchdog.events import LoggingEventHandler
 from .server import AsgiTransport, AsgiServer
 from .error_handler import ResponseErrorHandler
 
-event_handler = LoggingEventHandler()
-
 
 class AsgiStrategy(BaseStrategy):
     """
@@ -21,10 +18,9 @@ class AsgiStrategy(BaseStrategy):
         :param kwargs:
         :return:
         """
-        host = kwargs['host'] if hasattr(kwargs, 'host') else 'localhost'
-        port = kwargs['port'] if hasattr(kwargs, 'port') else 8080
+        host = kwargs.get('host', 'localhost')
+        port = kwargs.get('port', 8080)
 
-        server = AsgiServer(host, port, error_handler=error_handler)
-        transport = kwargs.get('transport', AsgiTransport)
-        server.init_transport(transport)
+        server = AsgiServer(host, port, error_handler=error_handler,
+                            transport_class=kwargs.get('transport', AsgiTransport))
         return server.execute(*args, **kwargs)
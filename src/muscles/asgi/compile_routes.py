@@ -0,0 +1,63 @@
+"""
+Сборка снимка таблиц маршрутов
+
+    python -m muscles.asgi.compile_routes myapp.views -o myapp/compiled_routes.py
+
+Модули из аргументов импортируются, чтобы зарегистрировать маршруты, после чего
+функции поиска всех роутеров записываются в отдельный модуль. Приложение подключает
+снимок переменной окружения MUSCLES_ASGI_COMPILED_ROUTES=myapp.compiled_routes.
+Снимок нужно собирать заново после изменения маршрутов, устаревшие таблицы
+компилируются при запуске как обычно.
+"""
+import argparse
+import importlib
+import os
+import sys
+from pprint import pformat
+
+from .asgi.routers import routes
+
+HEADER = '''"""
+Снимок таблиц маршрутов, собран muscles.asgi.compile_routes. Не редактировать.
+"""
+
+'''
+
+
+def render(tables):
+    """
+    Исходный код модуля снимка
+
+    :param tables: Описания таблиц, см. Routes.snapshot
+    :return: str
+    """
+    return "%sTABLES = %s\n" % (HEADER, pformat(tables, width=120))
+
+
+def main(argv=None):
+    """
+    Точка входа командной строки
+
+    :param argv: Аргументы
+    :return: int
+    """
+    parser = argparse.ArgumentParser(prog='muscles.asgi.compile_routes', description='Сборка снимка таблиц маршрутов')
+    parser.add_argument('modules', nargs='+', help='Модули, регистрирующие маршруты')
+    parser.add_argument('-o', '--output', help='Файл снимка, по умолчанию stdout')
+    args = parser.parse_args(argv)
+
+    sys.path.insert(0, os.getcwd())
+    for module in args.modules:
+        importlib.import_module(module)
+
+    source = render(routes.snapshot())
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(source)
+    else:
+        sys.stdout.write(source)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
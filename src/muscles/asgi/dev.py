@@ -0,0 +1,9 @@
+from .watchdog import Watchdog, PatternMatchingHandler
+from .uwsgi import UwsgiReload
+
+
+__all__ = (
+    "Watchdog",
+    "PatternMatchingHandler",
+    "UwsgiReload",
+)
@@ -3,7 +3,7 @@ import re
 
 from muscles.core import EventsStorageInterface, inject
 from muscles.core import Itinerary
-from ..asgi import Routes
+from ..asgi.routers import Routes
 from ..template import Template
 from muscles.core import Schema
 from .swagger import Swagger
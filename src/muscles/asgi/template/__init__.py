@@ -1,6 +1,4 @@
-from .template import TemplateLoader
-from .template import Filters
-from .template import Template
+from .template import TemplateLoader, Filters, Template
 
 
 __all__ = (
@@ -0,0 +1,102 @@
+import asyncio
+
+import pytest
+
+from src.muscles.asgi.asgi.error_handler import ApplicationException
+from src.muscles.asgi.asgi.request import RequestMaker, BodyPart, ImproperBodyPartContentException
+from src.muscles.asgi.asgi.request import _iter_multipart, _content_length
+
+BODY = (
+    b'--XyZ\r\n'
+    b'Content-Disposition: form-data; name="title"\r\n'
+    b'\r\n'
+    b'Hello\r\n'
+    b'--XyZ\r\n'
+    b'Content-Disposition: form-data; name="upload"; filename="my file; v1.txt"\r\n'
+    b'Content-Type: text/plain\r\n'
+    b'\r\n'
+    b'file content\r\n'
+    b'--XyZ\r\n'
+    b'Content-Disposition: form-data; name=plain; filename=plain.bin\r\n'
+    b'\r\n'
+    b'\x00\x01\r\n'
+    b'--XyZ--\r\n'
+)
+
+
+def make_body(content_type, body):
+    messages = [{'type': 'http.request', 'body': body, 'more_body': False}]
+
+    async def receive():
+        return messages.pop(0) if messages else {'type': 'http.disconnect'}
+
+    maker = RequestMaker({'headers': [(b'content-type', content_type.encode('latin-1'))]}, receive)
+    return asyncio.run(maker.make_body_from_multipart())
+
+
+def test_iter_multipart_parts():
+    parts = list(_iter_multipart(BODY, b'XyZ', 'utf-8'))
+    assert [part.name for part in parts] == ['title', 'upload', 'plain']
+    assert parts[0].filename is None
+    assert parts[0].text == 'Hello'
+    assert parts[1].filename == 'my file; v1.txt'
+    assert parts[1].content_type == 'text/plain'
+    assert parts[1].content == b'file content'
+    assert parts[2].filename == 'plain.bin'
+    assert parts[2].content == b'\x00\x01'
+
+
+def test_iter_multipart_content_length():
+    content = b'line\r\n--XyZ\r\nnot a boundary'
+    body = (
+        b'--XyZ\r\n'
+        b'Content-Disposition: form-data; name="data"; filename="data.bin"\r\n'
+        b'Content-Length: %d\r\n'
+        b'\r\n'
+        b'%s\r\n'
+        b'--XyZ--\r\n'
+    ) % (len(content), content)
+    parts = list(_iter_multipart(body, b'XyZ', 'utf-8'))
+    assert len(parts) == 1
+    assert parts[0].content == content
+
+
+def test_content_length():
+    assert _content_length(b'\r\nContent-Disposition: form-data\r\nContent-Length: 12') == 12
+    assert _content_length(b'\r\ncontent-length: 3\r\nContent-Type: text/plain') == 3
+    assert _content_length(b'\r\nContent-Length: abc') is None
+    assert _content_length(b'\r\nContent-Disposition: form-data') is None
+
+
+def test_iter_multipart_errors():
+    with pytest.raises(ImproperBodyPartContentException):
+        list(_iter_multipart(BODY[:-30], b'XyZ', 'utf-8'))
+    with pytest.raises(ImproperBodyPartContentException):
+        list(_iter_multipart(BODY, b'Other', 'utf-8'))
+    with pytest.raises(ImproperBodyPartContentException):
+        BodyPart(b'Content-Disposition: form-data; name="x"', 'utf-8')
+
+
+def test_make_body_from_multipart():
+    fields = make_body('multipart/form-data; boundary=XyZ', BODY)
+    assert fields['title'] == 'Hello'
+    assert fields['upload'] == {
+        'filename': 'my file; v1.txt',
+        'content_type': 'text/plain',
+        'content': b'file content',
+        'size': 12,
+    }
+    assert fields['plain']['content_type'] == 'text/plain'
+    assert make_body('multipart/form-data; boundary="XyZ"', BODY)['title'] == 'Hello'
+
+
+@pytest.mark.parametrize('content_type, body', [
+    ('multipart/form-data', BODY),
+    ('multipart/form-data; boundary=Other', BODY),
+    ('multipart/form-data; boundary=XyZ', BODY[:-30]),
+    ('multipart/form-data; boundary=XyZ', b'--XyZ\r\nno header end\r\n--XyZ--\r\n'),
+])
+def test_make_body_from_multipart_bad_request(content_type, body):
+    with pytest.raises(ApplicationException) as e:
+        make_body(content_type, body)
+    assert e.value.status == 400
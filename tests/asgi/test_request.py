@@ -0,0 +1,39 @@
+import asyncio
+
+from src.muscles.asgi.asgi.request import Request, RequestMaker, _parse_content_type, _parse_media_type
+
+
+def test_m_query_independent_of_query():
+    request = Request(type='http', method='GET', protocol='http', url='http://localhost/x?a=1&a=2&b=3')
+    assert request.m_query == request.query == {'a': ['1', '2'], 'b': '3'}
+    assert request.m_query is request.m_query
+    request.m_query['b'] = 'changed'
+    request.m_query['a'].append('4')
+    assert request.query == {'a': ['1', '2'], 'b': '3'}
+
+
+def test_request_maker_subclass_body_maker():
+    class JsonRequestMaker(RequestMaker):
+        async def make_body_from_json(self):
+            return {'overridden': True}
+
+    async def receive():
+        return {'type': 'http.request', 'body': b'{}', 'more_body': False}
+
+    scope = {
+        'type': 'http', 'method': 'POST', 'scheme': 'http', 'path': '/x', 'raw_path': b'/x', 'query_string': b'',
+        'headers': [(b'host', b'localhost'), (b'content-type', b'application/json')],
+    }
+    request = asyncio.run(JsonRequestMaker(scope, receive).make())
+    assert request.body == {'overridden': True}
+
+
+def test_parse_content_type_boundary_not_cached():
+    _parse_media_type.cache_clear()
+    for n in range(200):
+        main, params = _parse_content_type('multipart/form-data; boundary=b%d; charset=UTF-8' % n)
+        assert main == 'multipart/form-data'
+        assert params == {'boundary': 'b%d' % n, 'charset': 'UTF-8'}
+    assert _parse_content_type('multipart/form-data; BOUNDARY="a;b"')[1] == {'boundary': 'a;b'}
+    assert _parse_content_type('text/html; charset=UTF-8') == ('text/html', {'charset': 'UTF-8'})
+    assert _parse_media_type.cache_info().currsize == 3
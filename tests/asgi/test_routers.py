@@ -0,0 +1,161 @@
+import sys
+from types import SimpleNamespace
+
+import pytest
+from muscles.core import Itinerary
+
+from src.muscles.asgi.asgi import routers
+from src.muscles.asgi.asgi.routers import Routes, RouteTable, routes
+
+
+def make_request(method, path, content_type='text/html'):
+    return SimpleNamespace(method=method, path=path, content_type=content_type)
+
+
+def get_x(request):
+    return 'a'
+
+
+def post_x(request):
+    return 'b'
+
+
+def test_route_table_candidates_by_node():
+    instance = Routes(name='test_route_table_candidates_by_node')
+    instance.add('/method-split', key='a', handler=get_x, method='GET')
+    instance.add('/method-split', key='b', handler=post_x, method='POST')
+    table = RouteTable(instance)
+    table.compile()
+    for method in ('GET', 'POST', 'PUT'):
+        request = make_request(method, '/method-split')
+        assert table.resolve(request) == instance.get_current_route(request)
+        assert routes.resolve(request)[1:] == instance.get_current_route(request)
+    assert table.resolve(make_request('POST', '/method-split'))[0]['handler'] is post_x
+
+
+def json_x(request):
+    return 'json'
+
+
+def make_instance(name):
+    instance = Routes(name=name)
+    if not instance.nodes_map:
+        instance.add('/eq/static/a', handler=get_x)
+        instance.add('/eq/static/b/c', handler=get_x, method='GET')
+        instance.add('/eq/item/{id:int}', handler=get_x)
+        instance.add('/eq/name/{name}', handler=get_x)
+        instance.add('/eq/page/new', handler=post_x)
+        instance.add('/eq/page/{slug}', handler=get_x)
+        instance.add('/eq/method', key='eq.method.get', handler=get_x, method='GET')
+        instance.add('/eq/method', key='eq.method.post', handler=post_x, method='POST')
+        instance.add('/eq/type', handler=json_x, content_type='application/json')
+        instance.add('/eq/type', handler=get_x)
+    return instance
+
+
+EQUIVALENCE_REQUESTS = [
+    make_request(method, path, content_type)
+    for method in ('GET', 'POST', 'DELETE')
+    for content_type in ('text/html', 'application/json')
+    for path in (
+        '/eq/static/a', '/eq/static/b/c', '/eq/static/missing',
+        '/eq/item/42', '/eq/item/abc', '/eq/name/some%20name',
+        '/eq/page/new', '/eq/page/old',
+        '/eq/method', '/eq/type', '/eq', '/missing',
+    )
+]
+
+
+def assert_equivalent(table, instance):
+    for request in EQUIVALENCE_REQUESTS:
+        assert table.match(request.path) == instance.match_with_params(request.path)
+        assert table.resolve(request) == instance.get_current_route(request)
+
+
+def test_route_table_compiled_equivalence():
+    instance = make_instance('test_route_table_compiled_equivalence')
+    table = RouteTable(instance)
+    assert table.compile()
+    assert table.source is not None
+    assert_equivalent(table, instance)
+
+
+def test_route_table_precedence():
+    instance = make_instance('test_route_table_precedence')
+    table = RouteTable(instance)
+    table.compile()
+    assert table.resolve(make_request('GET', '/eq/page/new'))[0]['handler'] is post_x
+    assert table.resolve(make_request('GET', '/eq/page/old')) == (
+        instance.get_current_route(make_request('GET', '/eq/page/old')))
+    assert table.resolve(make_request('GET', '/eq/item/7'))[1] == {'id': '7'}
+    assert table.resolve(make_request('GET', '/eq/item/abc')) == (None, ())
+    assert table.resolve(make_request('POST', '/eq/method'))[0]['handler'] is post_x
+    assert table.resolve(make_request('GET', '/eq/type', 'application/json'))[0]['handler'] is json_x
+
+
+def test_route_table_stale_rebuild(monkeypatch):
+    monkeypatch.setattr(routers, 'FREEZE_ROUTES', True)
+    instance = make_instance('test_route_table_stale_rebuild')
+    instance.freeze()
+    request = make_request('GET', '/eq/stale/added')
+    assert instance.resolve(request) == (None, None, {})
+    instance.add('/eq/stale/added', handler=get_x)
+    assert any(table.is_stale() for table in instance._tables)
+    assert instance.resolve(request) == (instance,) + instance.get_current_route(request)
+    assert not any(table.is_stale() for table in instance._tables)
+
+
+def test_route_table_snapshot(monkeypatch):
+    instance = make_instance('test_route_table_snapshot')
+    snapshot = instance.snapshot()
+    tables = {table.name: table for table in instance._tables}
+    name = next(name for name, table in tables.items() if table.instance is instance)
+    snapshot[name] = dict(snapshot[name], source=snapshot[name]['source'] + '# snapshot\n')
+    monkeypatch.setitem(sys.modules, 'eq_routes_snapshot', SimpleNamespace(TABLES=snapshot))
+    monkeypatch.setattr(routers, 'COMPILED_ROUTES', 'eq_routes_snapshot')
+    table = next(table for table in instance.freeze() if table.instance is instance)
+    assert table.source.endswith('# snapshot\n')
+    assert_equivalent(table, instance)
+
+
+def test_route_table_snapshot_mismatch(monkeypatch):
+    instance = make_instance('test_route_table_snapshot_mismatch')
+    table = RouteTable(instance, ('Routes', 'test_route_table_snapshot_mismatch'))
+    generated = table.generate()
+    stale = dict(generated, size=generated['size'] - 1, source=generated['source'] + '# stale\n')
+    broken = dict(generated, source='def match(path):\n    return _missing\n', pattern='(')
+    for snapshot in (stale, broken):
+        table = RouteTable(instance, ('Routes', 'test_route_table_snapshot_mismatch'))
+        assert table.compile(snapshot)
+        assert table.source == generated['source']
+        assert_equivalent(table, instance)
+    monkeypatch.setattr(routers, 'COMPILED_ROUTES', 'eq_routes_snapshot_missing')
+    with pytest.warns(UserWarning):
+        tables = instance.freeze()
+    assert_equivalent(next(table for table in tables if table.instance is instance), instance)
+
+
+def test_routes_current_static():
+    instance = Routes(name='test_routes_current_static')
+    if not instance.static_map:
+        instance.add_static('/tmp/eq-files', prefix='/files', full_path=True)
+        instance.add_static('/tmp/eq-root', full_path=True)
+    for path in ('/files/a.txt', '/FILES/a.txt', '/files', '/other/a.txt'):
+        request = make_request('GET', path)
+        assert instance.get_current_static(request) is Itinerary.get_current_static(instance, request)
+
+
+def test_resolve_cache_junk_methods(monkeypatch):
+    monkeypatch.setattr(routers, 'FREEZE_ROUTES', True)
+    instance = Routes(name='test_resolve_cache_junk_methods')
+    if not instance.nodes_map:
+        instance.add('/eq-junk/any', handler=get_x)
+        instance.add('/eq-junk/post', handler=post_x, method='POST')
+    instance.freeze()
+    methods = set(instance._cache)
+    for n in range(100):
+        request = make_request('JUNK%d' % n, '/eq-junk/any')
+        assert instance.resolve(request) == (instance,) + instance.get_current_route(request)
+        assert instance.resolve(make_request('JUNK%d' % n, '/eq-junk/post')) == (None, None, {})
+        assert instance.resolve(make_request('JUNK%d' % n, '/eq-junk/missing')) == (None, None, {})
+    assert set(instance._cache) <= methods | {'*'}
@@ -0,0 +1,159 @@
+import asyncio
+import json
+
+from muscles.core import EventsStorage
+
+from src.muscles.asgi.asgi import server as asgi_server
+from src.muscles.asgi.asgi.response import BaseResponse, BadResponse
+from src.muscles.asgi.asgi.routers import routes
+from src.muscles.asgi.asgi.server import AsgiServer
+
+
+@routes.init('/test-server/ok', method='GET')
+def server_ok(request):
+    return {'ok': True}
+
+
+class CountingErrorHandler:
+    created = 0
+
+    def __init__(self):
+        CountingErrorHandler.created += 1
+
+    def handler(self, status=500, reason=None, body=None, trace=None, request=None):
+        return BadResponse(status=status, reason=reason, body='handled', trace=trace, request=request)
+
+
+def make_scope(method, path, headers=None):
+    return {
+        'type': 'http', 'method': method, 'scheme': 'http', 'path': path, 'raw_path': path.encode(),
+        'query_string': b'', 'server': ('127.0.0.1', 8000), 'client': ('127.0.0.1', 5555),
+        'headers': [(b'host', b'localhost:8000')] + (headers or []),
+    }
+
+
+def call(scope, error_handler=None, body=b''):
+    sent = []
+    messages = [{'type': 'http.request', 'body': body, 'more_body': False}]
+
+    async def receive():
+        return messages.pop(0) if messages else {'type': 'http.disconnect'}
+
+    async def send(message):
+        sent.append(message)
+
+    server = AsgiServer('localhost', 8000, error_handler=error_handler)
+    asyncio.run(server.execute(scope=scope, receive=receive, send=send))
+    return sent
+
+
+def test_events_storage_shared_between_servers():
+    first = AsgiServer('localhost', 8000, error_handler=None)
+    second = AsgiServer('localhost', 8000, error_handler=None)
+    assert first.events is second.events
+    assert asgi_server._events is first.events
+
+
+def test_error_handler_created_on_error_only():
+    CountingErrorHandler.created = 0
+    sent = call(make_scope('GET', '/test-server/ok'), error_handler=CountingErrorHandler)
+    assert sent[0]['status'] == 200
+    assert CountingErrorHandler.created == 0
+    sent = call(make_scope('GET', '/test-server/missing'), error_handler=CountingErrorHandler)
+    assert sent[0]['status'] == 404
+    assert CountingErrorHandler.created == 1
+
+
+def static_header(resp):
+    resp.header_append(('X-Static', 'yes'))
+    return resp
+
+
+def static_denied(resp):
+    raise PermissionError('denied')
+
+
+def test_static_handler_runs_on_not_modified(tmp_path):
+    (tmp_path / 'a.txt').write_bytes(b'content')
+    routes.add_static(str(tmp_path), prefix='/test-static-header', handler=static_header, full_path=True)
+    routes.add_static(str(tmp_path), prefix='/test-static-denied', handler=static_denied, full_path=True)
+
+    sent = call(make_scope('GET', '/test-static-header/a.txt'))
+    headers = dict(sent[0]['headers'])
+    assert sent[0]['status'] == 200
+    assert headers[b'x-static'] == b'yes'
+
+    sent = call(make_scope('GET', '/test-static-header/a.txt', [(b'if-none-match', headers[b'etag'])]))
+    assert sent[0]['status'] == 304
+    assert dict(sent[0]['headers'])[b'x-static'] == b'yes'
+
+    sent = call(make_scope('GET', '/test-static-denied/a.txt', [(b'if-none-match', headers[b'etag'])]))
+    assert sent[0]['status'] == 404
+
+
+@routes.init('/test-server/cors', method='OPTIONS')
+def server_cors(request):
+    return BaseResponse(status=200, headers=[('Access-Control-Allow-Origin', 'http://example.com')], request=request)
+
+
+PREFLIGHT = [(b'origin', b'http://example.com'), (b'access-control-request-method', b'POST')]
+
+
+def test_preflight_routed_by_default():
+    sent = call(make_scope('OPTIONS', '/test-server/cors', PREFLIGHT))
+    assert sent[0]['status'] == 204
+    assert (b'access-control-allow-origin', b'http://example.com') in sent[0]['headers']
+
+
+def test_fast_preflight(monkeypatch):
+    monkeypatch.setattr(asgi_server, 'FAST_PREFLIGHT', True)
+    sent = call(make_scope('OPTIONS', '/test-server/cors', PREFLIGHT))
+    assert sent[0]['status'] == 204
+    assert (b'access-control-allow-origin', b'*') in sent[0]['headers']
+
+
+def failing_before_request(request):
+    if request.path.startswith('/test-server/before-request-error'):
+        raise RuntimeError('before_request failed')
+
+
+def test_before_request_error_json_body():
+    EventsStorage().add('before_request', failing_before_request)
+    sent = call(make_scope('GET', '/test-server/before-request-error'))
+    assert sent[0]['status'] == 500
+    assert (b'content-type', b'application/json; charset=utf-8') in sent[0]['headers']
+    body = json.loads(sent[1]['body'])
+    assert body['status'] == 'ERROR'
+    assert isinstance(body['body'], list)
+    assert any('failing_before_request' in line for line in body['body'])
+
+
+def test_lifespan_warmup(monkeypatch):
+    warmed = []
+    monkeypatch.setattr(asgi_server, 'warmup', lambda: warmed.append(True))
+    sent = []
+    messages = [{'type': 'lifespan.startup'}, {'type': 'lifespan.shutdown'}]
+
+    async def receive():
+        return messages.pop(0)
+
+    async def send(message):
+        sent.append(message)
+
+    server = AsgiServer('localhost', 8000, error_handler=None)
+    asyncio.run(server.execute(scope={'type': 'lifespan', 'asgi': {'version': '3.0'}}, receive=receive, send=send))
+    assert warmed == [True]
+    assert sent == [{'type': 'lifespan.startup.complete'}, {'type': 'lifespan.shutdown.complete'}]
+    assert messages == []
+
+
+def static_forbidden(resp):
+    return BaseResponse(status=403, body='denied', request=resp.request)
+
+
+def test_static_handler_replaces_file(tmp_path):
+    (tmp_path / 'a.txt').write_bytes(b'secret')
+    routes.add_static(str(tmp_path), prefix='/test-static-forbidden', handler=static_forbidden, full_path=True)
+    sent = call(make_scope('GET', '/test-static-forbidden/a.txt'))
+    assert sent[0]['status'] == 403
+    assert b''.join(message.get('body', b'') for message in sent[1:]) == b'denied'